@@ -0,0 +1,32 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "code.settings")
+os.environ.setdefault("ASGI", "1")
+
+import django
+from django.core.exceptions import ImproperlyConfigured
+
+# The async views use the async ORM (aget, acount...), added in Django 4.1
+if django.VERSION < (4, 1):
+    raise ImproperlyConfigured("code.asgi needs Django 4.1 or later, serve code.wsgi with older versions")
+
+from django.core.asgi import get_asgi_application
+
+application = get_asgi_application()
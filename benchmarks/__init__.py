@@ -0,0 +1,22 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Benchmarks for the performance work on the blog. Each one runs from the
+# project directory (the one with manage.py and config.ini), for example
+#     python -m code.benchmarks.bodies
+# with the debug settings and a throwaway SQLite database, so the site's
+# own database is never touched.
@@ -0,0 +1,75 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Throughput of the JSON API against rendering the HTML pages that show
+# the same content, requested back to back in one process.
+#
+#     python -m code.benchmarks.api --posts 100 --runs 300
+
+from . import common
+
+import argparse
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--comments", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=300)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from code.blog import models, settings
+
+    client = common.client()
+    # Listings of the same size on both sides
+    settings.POSTS_PER_PAGE = settings.API_PAGE_SIZE
+
+    posts = common.seed_posts(args.posts, paragraphs=5)
+    commenter = models.User.objects.create(username="reader", name="Reader")
+    for post in posts:
+        comments = [models.Comment.objects.create(author=commenter, body=common.text(1, 40))
+                    for _ in range(args.comments)]
+        post.comments.add(*comments)
+
+    post = posts[len(posts) // 2]
+    size = settings.API_PAGE_SIZE
+    pairs = [
+        ("index ({} posts)".format(size), "/",
+         "/api/v1/posts/"),
+        ("index with bodies", "/",
+         "/api/v1/posts/?fields=id,title,url,date,tags,authors,body"),
+        ("feed", "/feed/",
+         "/api/v1/posts/?fields=id,title,url,date,edit_date,authors,body&size={}".format(settings.ATOM_POSTS)),
+        ("post with comments", post.get_absolute_url(),
+         "/api/v1/posts/{}/?fields=title,date,body,tags,authors,files,comments".format(post.pk)),
+        ("post without body and comments", post.get_absolute_url(),
+         "/api/v1/posts/{}/".format(post.pk)),
+        ("tags", "/tags/",
+         "/api/v1/tags/"),
+    ]
+
+    for label, html, api in pairs:
+        for kind, path in [("html", html), ("api", api)]:
+            response = client.get(path)
+            if response.status_code != 200:
+                raise RuntimeError("{} answered {}".format(path, response.status_code))
+            samples = common.measure(lambda: client.get(path), args.runs)
+            common.report("{} {} ({:.0f} req/s)".format(label, kind, len(samples) / sum(samples)), samples)
+
+if __name__ == "__main__":
+    main()
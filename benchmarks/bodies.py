@@ -0,0 +1,94 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Compressed bodies: row and table size, and listing latency, with each
+# body_compression setting.
+#
+#     python -m code.benchmarks.bodies --posts 200 --paragraphs 10
+#
+# "cold" runs empty the decoded body cache before each run, as on a site
+# with more bodies than body_cache_size; "warm" runs keep it.
+
+from . import common
+
+import argparse
+
+def table_size(connection, table):
+    # Bytes of the table's pages, after a VACUUM so that deleted rows of
+    # the previous setting don't count
+    with connection.cursor() as cursor:
+        cursor.execute("VACUUM")
+        try:
+            cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = %s", [table])
+            return cursor.fetchone()[0]
+        except Exception:
+            # SQLite built without dbstat: the whole database
+            cursor.execute("PRAGMA page_count")
+            pages = cursor.fetchone()[0]
+            cursor.execute("PRAGMA page_size")
+            return pages * cursor.fetchone()[0]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--paragraphs", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=60)
+    parser.add_argument("--modes", nargs="+", default=["none", "zlib", "zstd"])
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.db import connection
+    from code.blog import models, settings, compressed
+
+    client = common.client()
+    settings.POSTS_PER_PAGE = settings.ATOM_POSTS = 50
+
+    for mode in args.modes:
+        if mode == "zstd" and compressed.zstandard is None:
+            print("zstd: skipped, the zstandard module isn't installed")
+            continue
+
+        settings.BODY_COMPRESSION = mode
+        models.Post.objects.all().delete()
+        common.seed_posts(args.posts, paragraphs=args.paragraphs)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT AVG(LENGTH(body)) FROM blog_post")
+            row = cursor.fetchone()[0]
+        raw = sum(len(post.body.encode("utf-8")) for post in models.Post.objects.all()) / args.posts
+
+        print("{}: row {:.0f} bytes (text {:.0f}), table {} KiB".format(
+            mode, row, raw, table_size(connection, models.Post._meta.db_table) // 1024))
+
+        titles = lambda: [post.title for post in models.Post.objects.all()]
+        bodies = lambda: [len(post.body) for post in models.Post.objects.all()]
+        deferred = lambda: [post.title for post in models.Post.objects.defer('body')]
+        index = lambda: client.get("/")
+        feed = lambda: client.get("/feed/")
+
+        common.report("  {} rows, titles only".format(args.posts), common.measure(titles, args.runs, compressed.cache.clear))
+        common.report("  {} rows, body deferred".format(args.posts), common.measure(deferred, args.runs, compressed.cache.clear))
+        common.report("  {} rows, bodies, cold".format(args.posts), common.measure(bodies, args.runs, compressed.cache.clear))
+        common.report("  {} rows, bodies, warm".format(args.posts), common.measure(bodies, args.runs))
+        common.report("  index (50 posts), cold", common.measure(index, args.runs, compressed.cache.clear))
+        common.report("  index (50 posts), warm", common.measure(index, args.runs))
+        common.report("  feed (50 posts), cold", common.measure(feed, args.runs, compressed.cache.clear))
+        common.report("  feed (50 posts), warm", common.measure(feed, args.runs))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Shared setup, data and timing helpers
+
+from datetime import datetime, timedelta
+import statistics
+import tempfile
+import shutil
+import atexit
+import random
+import time
+import os
+
+def setup(configure=None, **environ):
+    # Before anything imports the settings. configure(settings) can change
+    # them before the first connection; a database it configures is only
+    # used to create a test database next to it, destroyed at exit.
+    # Returns the temporary directory holding the SQLite database, removed
+    # at exit.
+    directory = tempfile.mkdtemp(prefix="blog-benchmark-")
+    atexit.register(shutil.rmtree, directory, True)
+
+    os.environ.update({
+        "DJANGO_SETTINGS_MODULE": "code.settings",
+        "DEBUG": "1",
+        "SQLITE_DATABASE": os.path.join(directory, "db.sqlite3"),
+    }, **environ)
+
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+
+    if configure:
+        configure(settings)
+
+    django.setup()
+
+    if connection.vendor == "sqlite":
+        call_command("migrate", verbosity=0)
+    else:
+        name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0)
+        atexit.register(lambda: connection.creation.destroy_test_db(name, verbosity=0))
+
+    return directory
+
+def client():
+    from django.test import Client
+
+    # localhost is allowed by the debug settings, testserver only in tests
+    return Client(HTTP_HOST="localhost")
+
+WORDS = None
+
+def text(paragraphs, words=120):
+    global WORDS
+
+    if WORDS is None:
+        rng = random.Random(1)
+        WORDS = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 9)))
+                 for _ in range(800)]
+
+    return "\n\n".join("<p>" + " ".join(random.choice(WORDS) for _ in range(words)) + "</p>"
+                       for _ in range(paragraphs))
+
+def seed_posts(count, paragraphs=1, tags=3):
+    # Published posts, a day apart, each with an author and a few tags
+    from code.blog import models
+
+    random.seed(1)
+    author, _ = models.User.objects.get_or_create(username="author", defaults={"name": "Author"})
+    all_tags = [models.Tag.objects.get_or_create(uid="tag{}".format(n), defaults={"name": "Tag {}".format(n)})[0]
+                for n in range(max(tags * 2, 1))]
+
+    posts = []
+    for n in range(count):
+        post = models.Post(uid="post-{}".format(n), title="Post {}".format(n), body=text(paragraphs),
+                           draft=False, date=datetime(2018, 1, 1) + timedelta(days=n))
+        post.save()
+        post.authors.add(author)
+        post.tags.add(*random.sample(all_tags, tags))
+        posts.append(post)
+
+    return posts
+
+def measure(func, runs, before=None):
+    # Seconds per run, after a first untimed run
+    func()
+    samples = []
+    for _ in range(runs):
+        if before:
+            before()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def summary(samples):
+    return "p50 {:7.2f} ms  p99 {:7.2f} ms  mean {:7.2f} ms".format(
+        percentile(samples, 0.5) * 1000, percentile(samples, 0.99) * 1000, statistics.mean(samples) * 1000)
+
+def report(label, samples):
+    print("{:<40} {}".format(label, summary(samples)))
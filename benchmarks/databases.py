@@ -0,0 +1,108 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Read throughput of the production SQLite profile against the Postgres
+# path: the public pages, requested back to back by a few processes (like
+# the workers of a preforking server) for a fixed time.
+#
+#     python -m code.benchmarks.databases --postgres postgres://user@host/name
+#
+# Without --postgres only SQLite runs, plain and with the profile. The
+# Postgres database is only used to create a test database next to it
+# (needs dj_database_url and psycopg2). Every configuration keeps its
+# connections open between requests, like the production settings.
+
+from . import common
+
+import multiprocessing
+import subprocess
+import argparse
+import time
+import sys
+
+def configure(backend, url):
+    def configure_settings(settings):
+        if backend == "postgres":
+            import dj_database_url
+            settings.DATABASES = {"default": dj_database_url.parse(url, conn_max_age=500)}
+        else:
+            settings.DATABASES["default"]["CONN_MAX_AGE"] = 500
+
+        if backend == "sqlite-profile":
+            settings.DATABASES["default"]["OPTIONS"] = {"timeout": 20}
+            settings.SQLITE_PRAGMAS = settings.SQLITE_PROFILE_PRAGMAS
+
+    return configure_settings
+
+def worker(paths, seconds, results):
+    client = common.client()
+    samples = []
+    deadline = time.perf_counter() + seconds
+
+    n = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = client.get(paths[n % len(paths)])
+        samples.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError("{} answered {}".format(paths[n % len(paths)], response.status_code))
+        n += 1
+
+    results.put(samples)
+
+def run(backend, args):
+    common.setup(configure(backend, args.postgres))
+
+    from django.db import connections
+
+    posts = common.seed_posts(args.posts, paragraphs=5)
+    paths = ["/", "/feed/", "/tag/tag0/"] + [post.get_absolute_url() for post in posts]
+
+    # Each process opens its own connections
+    connections.close_all()
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(paths, args.seconds, results))
+                 for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    samples = [sample for _ in processes for sample in results.get()]
+    for process in processes:
+        process.join()
+
+    common.report("{} ({:.0f} req/s)".format(backend, len(samples) / args.seconds), samples)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--postgres", help="URL of a Postgres database to create the test database next to")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args.run, args)
+        return
+
+    # A process per configuration, the settings can't change once loaded
+    backends = ["sqlite", "sqlite-profile"] + (["postgres"] if args.postgres else [])
+    for backend in backends:
+        subprocess.run([sys.executable, "-m", __spec__.name, "--run", backend] + sys.argv[1:], check=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# The WSGI path (gunicorn, sync workers) against the ASGI path (uvicorn,
+# async views) under the same load: the same number of worker processes,
+# and a fixed number of concurrent keep-alive clients sending the same
+# requests. Needs gunicorn and uvicorn, and Django 4.1 or later for the
+# ASGI side.
+#
+#     python -m code.benchmarks.servers --workers 2 --concurrency 32
+#
+# The servers use the debug settings and SQLite, so this measures the
+# request handling and not a database server. The async views only gain
+# when requests wait on a remote database or network.
+
+from . import common
+
+import argparse
+import http.client
+import subprocess
+import threading
+import socket
+import sys
+import time
+import os
+
+SERVERS = {
+    "wsgi": ["gunicorn", "code.wsgi:application", "--worker-class", "sync", "--bind", "127.0.0.1:{port}",
+             "--workers", "{workers}", "--log-level", "warning"],
+    "asgi": ["uvicorn", "code.asgi:application", "--host", "127.0.0.1", "--port", "{port}",
+             "--workers", "{workers}", "--log-level", "warning", "--no-access-log"],
+}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start(name, workers):
+    port = free_port()
+    command = [arg.format(port=port, workers=workers) for arg in SERVERS[name]]
+    # The project directory has to be importable as the parent of code
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.getcwd()] + sys.path))
+    process = subprocess.Popen([sys.executable, "-m"] + command, env=env)
+
+    for _ in range(300):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, port
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("{} exited with {}".format(name, process.returncode))
+            time.sleep(0.1)
+
+    process.kill()
+    raise RuntimeError("{} didn't start".format(name))
+
+def load(port, paths, concurrency, requests):
+    # Each client sends its share of the requests back to back on one
+    # connection, cycling through the paths
+    samples = []
+    errors = []
+    lock = threading.Lock()
+
+    def run(n):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        own = []
+        for i in range(n, requests, concurrency):
+            path = paths[i % len(paths)]
+            start = time.perf_counter()
+            try:
+                connection.request("GET", path, headers={"Host": "localhost"})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors.append((path, response.status))
+            except (OSError, http.client.HTTPException) as e:
+                errors.append((path, e))
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                continue
+            own.append(time.perf_counter() - start)
+        connection.close()
+        with lock:
+            samples.extend(own)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return samples, errors, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--servers", nargs="+", default=list(SERVERS))
+    args = parser.parse_args()
+
+    common.setup()
+    posts = common.seed_posts(30, paragraphs=5)
+
+    workloads = {
+        "index": ["/"],
+        "post": [post.get_absolute_url() for post in posts],
+        "feed": ["/feed/"],
+    }
+
+    for name in args.servers:
+        process, port = start(name, args.workers)
+        try:
+            for label, paths in workloads.items():
+                # Warm every worker up first
+                load(port, paths, args.concurrency, args.concurrency * 4)
+                samples, errors, elapsed = load(port, paths, args.concurrency, args.requests)
+                common.report("{} {} ({:.0f} req/s, {} errors)".format(
+                    name, label, len(samples) / elapsed, len(errors)), samples)
+        finally:
+            process.terminate()
+            process.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Cold start: the time to import the WSGI application and the latency of
+# the first requests of a fresh process, with and without WARM_UP.
+#
+#     python -m code.benchmarks.startup --runs 10
+#
+# Each run is a new interpreter. "process" is the whole run as seen from
+# outside, interpreter start included.
+
+from . import common
+
+import subprocess
+import argparse
+import json
+import time
+import sys
+import os
+
+def call(application, path):
+    from wsgiref.util import setup_testing_defaults
+
+    environ = {"PATH_INFO": path, "HTTP_HOST": "localhost"}
+    setup_testing_defaults(environ)
+
+    statuses = []
+    start = time.perf_counter()
+    body = b"".join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+    elapsed = time.perf_counter() - start
+
+    if not statuses[0].startswith("200"):
+        raise RuntimeError("{} answered {}".format(path, statuses[0]))
+    return elapsed, len(body)
+
+def child(paths):
+    start = time.perf_counter()
+    from code.wsgi import application
+    imported = time.perf_counter()
+
+    timings = {"import": imported - start}
+    for n, path in enumerate(paths):
+        timings["request {} {}".format(n + 1, path)] = call(application, path)[0]
+
+    print(json.dumps(timings))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--child", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        child(args.child)
+        return
+
+    common.setup()
+    posts = common.seed_posts(20, paragraphs=5)
+    # The first request of each page, then the first page again
+    paths = ["/", posts[0].get_absolute_url(), "/"]
+
+    for warm_up in [False, True]:
+        env = dict(os.environ)
+        env.pop("WARM_UP", None)
+        if warm_up:
+            env["WARM_UP"] = "1"
+
+        results = {}
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, "-m", __spec__.name, "--child"] + paths,
+                                    env=env, check=True, stdout=subprocess.PIPE).stdout
+            elapsed = time.perf_counter() - start
+
+            for name, value in json.loads(output.decode("utf-8").splitlines()[-1]).items():
+                results.setdefault(name, []).append(value)
+            results.setdefault("process", []).append(elapsed)
+
+        print("WARM_UP" if warm_up else "no warm-up")
+        for name, samples in results.items():
+            common.report("  " + name, samples)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# URL building in a 50-post listing and feed: every post, tag and author
+# link reversed, against the stored post paths, with {% url %} or the
+# memoized {% cached_url %} for the tag and author links.
+#
+#     python -m code.benchmarks.urls --runs 300
+#
+# The templates are minimal, so that most of the time is the links.
+
+from . import common
+
+import argparse
+
+POST_REVERSED = "{% url 'post' post.date.year post.date.month|stringformat:'02d' post.uid %}"
+POST_STORED = "{{ post.get_absolute_url }}"
+
+LISTING = """{% load blog_extras %}{% for post in posts %}
+<h2><a href="POST">{{ post.title }}</a></h2>
+{% for tag in post.tags.all %}<a href="{% URL 'tag' tag.uid %}">{{ tag.name }}</a> {% endfor %}
+{% for author in post.authors.all %}<a href="{% URL 'author' author.username %}">{{ author.name }}</a> {% endfor %}
+{% endfor %}"""
+
+FEED = """{% load blog_extras %}<feed>{% for post in posts %}
+<entry><link href="{{ site_url }}POST"/><title>{{ post.title }}</title>
+{% for author in post.authors.all %}<author><uri>{{ site_url }}{% URL 'author' author.username %}</uri></author>{% endfor %}
+{% for tag in post.tags.all %}<category term="{{ tag.name }}" scheme="{{ site_url }}{% URL 'tag' tag.uid %}"/>{% endfor %}
+</entry>{% endfor %}</feed>"""
+
+VARIANTS = [
+    ("reversed, {% url %}", POST_REVERSED, "url"),
+    ("stored path, {% url %}", POST_STORED, "url"),
+    ("stored path, {% cached_url %}", POST_STORED, "cached_url"),
+]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=300)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.template import engines
+    from code.blog import models
+
+    common.seed_posts(args.posts, tags=4)
+    # Loaded once, only the rendering is timed
+    posts = list(models.Post.objects.prefetch_related('tags', 'authors').order_by('-date')[:args.posts])
+    context = {"posts": posts, "site_url": "https://example.com"}
+    engine = engines["django"]
+
+    for page, source in [("listing", LISTING), ("feed", FEED)]:
+        for label, post_url, url_tag in VARIANTS:
+            template = engine.from_string(source.replace("POST", post_url).replace("URL", url_tag))
+            samples = common.measure(lambda: template.render(context), args.runs)
+            common.report("{} ({} posts), {}".format(page, len(posts), label), samples)
+
+if __name__ == "__main__":
+    main()
@@ -25,4 +25,6 @@ admin.site.register(models.Page)
 admin.site.register(models.File)
 admin.site.register(models.Comment)
 admin.site.register(models.Tag)
-#admin.site.register(models.User, readonly_fields=['pk'], list_display=('pk', 'date', 'url', 'ip', 'duration', 'visitors'))
+admin.site.register(models.Hit, list_display=('date', 'url', 'status', 'duration'))
+admin.site.register(models.HourlyStat, exclude=['sketch'], list_display=('hour', 'url', 'hits', 'visitors', 'duration'))
+admin.site.register(models.DailyStat, exclude=['sketch'], list_display=('day', 'url', 'hits', 'visitors', 'duration'))
@@ -0,0 +1,286 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Visitor analytics. Requests are appended to an in-memory buffer, written
+# in batches to the Hit table by a background thread, then rolled up into
+# hourly and daily statistics per URL (and for the whole site, with an
+# empty URL) and deleted. Unique visitors are estimated with HyperLogLog
+# sketches, which can be merged across hours, days and URLs.
+#
+# Visitors are identified by a hash of address and user agent salted with
+# the day, so no address is stored and visitors can't be followed across
+# days. Behind a proxy the address is taken from X-Forwarded-For.
+
+from django.conf import settings as project_settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection, transaction, close_old_connections
+from datetime import datetime, timedelta
+import collections
+import asyncio
+import threading
+import hashlib
+import logging
+import atexit
+import math
+import time
+import os
+
+from . import models
+from . import async_support
+from . import settings
+
+logger = logging.getLogger("code.blog.analytics")
+
+# Not worth recording
+IGNORED_PREFIXES = ["/admin/", "/static/", "/oauth2", "/submit_comment/", "/toggle_delete_comment/", "/logout/"]
+
+class HyperLogLog():
+    # 2^PRECISION one byte registers, about 3% standard error
+    PRECISION = 10
+
+    def __init__(self, registers=None):
+        self.size = 1 << self.PRECISION
+        self.registers = bytearray(registers) if registers else bytearray(self.size)
+
+    def add(self, value):
+        h = int.from_bytes(hashlib.sha1(value.encode("utf-8")).digest()[:8], "big")
+        index = h >> (64 - self.PRECISION)
+        rest = h & ((1 << (64 - self.PRECISION)) - 1)
+        rank = (64 - self.PRECISION) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        for n, value in enumerate(other.registers):
+            if value > self.registers[n]:
+                self.registers[n] = value
+
+    def count(self):
+        m = self.size
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -value for value in self.registers)
+
+        # Small range correction: linear counting of the empty registers
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+def client_address(request):
+    # Behind the proxy REMOTE_ADDR is the proxy's. Each proxy appends the
+    # address it was connected from to X-Forwarded-For, so the client is
+    # counted from the right: the entries before it can be forged.
+    if getattr(project_settings, "SECURE_PROXY_SSL_HEADER", None) and settings.ANALYTICS_PROXY_HOPS > 0:
+        addresses = [address.strip() for address in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")]
+        addresses = [address for address in addresses if address]
+        if len(addresses) >= settings.ANALYTICS_PROXY_HOPS:
+            return addresses[-settings.ANALYTICS_PROXY_HOPS]
+
+    return request.META.get("REMOTE_ADDR", "")
+
+def visitor_id(request, date):
+    salt = "{}:{}".format(project_settings.SECRET_KEY, date.strftime("%Y-%m-%d"))
+    value = "{}:{}:{}".format(salt, client_address(request), request.META.get("HTTP_USER_AGENT", ""))
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:32]
+
+# Hits not written yet, the oldest are dropped if the database can't keep up
+buffer = collections.deque(maxlen=10000)
+buffer_lock = threading.Lock()
+
+writer_pid = None
+
+def record(request, response, duration):
+    global writer_pid
+
+    date = datetime.utcnow()
+    hit = models.Hit(date=date, url=request.path[:200], visitor=visitor_id(request, date),
+                     status=response.status_code, duration=duration)
+
+    with buffer_lock:
+        if writer_pid != os.getpid():
+            buffer.clear()
+            threading.Thread(target=run_writer, name="analytics-writer", daemon=True).start()
+            writer_pid = os.getpid()
+
+        buffer.append(hit)
+
+def write():
+    with buffer_lock:
+        hits = list(buffer)
+        buffer.clear()
+
+    if hits:
+        models.Hit.objects.bulk_create(hits, batch_size=500)
+
+def run_writer():
+    last_rollup = time.monotonic()
+
+    while True:
+        time.sleep(settings.ANALYTICS_FLUSH_INTERVAL)
+        try:
+            write()
+
+            if settings.ANALYTICS_ROLLUP_INTERVAL > 0 and \
+                    time.monotonic() - last_rollup > settings.ANALYTICS_ROLLUP_INTERVAL:
+                rollup()
+                prune()
+                last_rollup = time.monotonic()
+        except Exception:
+            logger.exception("Writing the analytics failed")
+        finally:
+            close_old_connections()
+
+@atexit.register
+def write_at_exit():
+    if writer_pid == os.getpid():
+        try:
+            write()
+        except Exception:
+            pass
+
+class Group():
+    def __init__(self):
+        self.hits = 0
+        self.duration = 0.0
+        self.sketch = HyperLogLog()
+
+    def add(self, hit):
+        self.hits += 1
+        self.duration += hit.duration
+        self.sketch.add(hit.visitor)
+
+def merge_into(model, key_field, groups):
+    for (key, url), group in groups.items():
+        stat, created = model.objects.select_for_update().get_or_create(
+            **{key_field: key, "url": url}, defaults={"sketch": b""})
+
+        sketch = HyperLogLog(stat.sketch)
+        sketch.merge(group.sketch)
+
+        stat.hits += group.hits
+        stat.duration += group.duration
+        stat.sketch = sketch.to_bytes()
+        stat.visitors = sketch.count()
+        stat.save()
+
+def rollup(batch_size=5000):
+    # Moves the raw hits into the statistics, a batch per transaction so
+    # that locks are short. Runs in one process at a time (manage.py
+    # rollup_analytics, or the writer thread of a single dyno); on
+    # PostgreSQL concurrent runs skip each other's rows.
+    rolled = 0
+
+    while True:
+        with transaction.atomic():
+            hits = models.Hit.objects.order_by('pk')
+            if connection.features.has_select_for_update_skip_locked:
+                hits = hits.select_for_update(skip_locked=True)
+            hits = list(hits[:batch_size])
+
+            if not hits:
+                return rolled
+
+            hourly = collections.defaultdict(Group)
+            daily = collections.defaultdict(Group)
+            for hit in hits:
+                hour = hit.date.replace(minute=0, second=0, microsecond=0)
+                for url in [hit.url, ""]:
+                    hourly[(hour, url)].add(hit)
+                    daily[(hit.date.date(), url)].add(hit)
+
+            merge_into(models.HourlyStat, "hour", hourly)
+            merge_into(models.DailyStat, "day", daily)
+
+            models.Hit.objects.filter(pk__in=[hit.pk for hit in hits]).delete()
+            rolled += len(hits)
+
+def prune():
+    models.HourlyStat.objects.filter(
+        hour__lt=datetime.utcnow() - timedelta(days=settings.ANALYTICS_HOURLY_RETENTION_DAYS)).delete()
+
+def report(days):
+    # Site totals per day and the most visited URLs of the period, from the
+    # daily statistics only. Visitor hashes change every day, so merging the
+    # daily sketches counts visitor-days: someone coming back on three days
+    # counts three times.
+    since = (datetime.utcnow() - timedelta(days=days - 1)).date()
+    stats = models.DailyStat.objects.filter(day__gte=since)
+
+    totals = list(stats.filter(url="").order_by('-day'))
+
+    period = HyperLogLog()
+    for stat in totals:
+        period.merge(HyperLogLog(stat.sketch))
+
+    urls = collections.defaultdict(lambda: {"hits": 0, "duration": 0.0, "sketch": HyperLogLog()})
+    for stat in stats.exclude(url=""):
+        entry = urls[stat.url]
+        entry["hits"] += stat.hits
+        entry["duration"] += stat.duration
+        entry["sketch"].merge(HyperLogLog(stat.sketch))
+
+    top = sorted(urls.items(), key=lambda item: -item[1]["hits"])[:settings.ANALYTICS_TOP_URLS]
+
+    return {
+        "days": totals,
+        "hits": sum(stat.hits for stat in totals),
+        "visitor_days": period.count(),
+        "urls": [{
+            "url": url,
+            "hits": entry["hits"],
+            "visitor_days": entry["sketch"].count(),
+            "duration": entry["duration"] / entry["hits"],
+        } for url, entry in top],
+    }
+
+class AnalyticsMiddleware():
+    # First in MIDDLEWARE, so that the duration covers the whole stack.
+    # Recording only appends to the buffer, so it's safe in the event loop.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.ANALYTICS:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+
+        if self.is_async:
+            async_support.mark_coroutine(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.process(request, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.process(request, response, time.perf_counter() - start)
+        return response
+
+    def process(self, request, response, duration):
+        if request.method == "GET" and not any(request.path.startswith(prefix) for prefix in IGNORED_PREFIXES):
+            record(request, response, duration)
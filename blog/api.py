@@ -0,0 +1,217 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Read-only JSON API under /api/v1/ for published posts, pages, tags and
+# authors.
+#
+# Lists are paginated by keyset cursors (?after=, ?before=, ?size=) and
+# every resource takes ?fields=a,b to choose what is returned. Only the
+# columns of the chosen fields are read, and each chosen relation costs one
+# query for the whole page, whatever its size. Responses carry an ETag of
+# their content.
+
+from django.conf import settings as project_settings
+from django.db.models import Prefetch
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
+import functools
+import hashlib
+
+from . import models
+from . import settings
+from . import pagination
+from . import links
+
+PostAuthor = models.Post.authors.through
+
+def absolute(url):
+    return project_settings.SECURE_SITE_URL + url
+
+def files(document):
+    return [{"name": f.name, "url": absolute("{}{}/".format(document.get_absolute_url(), f.name))}
+            for f in document.files.all()]
+
+def comments(post):
+    return [{
+        "author": comment.author.name if comment.author else None,
+        "date": comment.date,
+        "body": comment.body,
+    } for comment in post.comments.all()]
+
+# Fields of each resource: name -> (columns, prefetch, value)
+POST_FIELDS = {
+    "id": ([], None, lambda post: post.pk),
+    "title": (["title"], None, lambda post: post.title),
+    "url": (["path"], None, lambda post: absolute(post.get_absolute_url())),
+    "date": (["date"], None, lambda post: post.date),
+    "edit_date": (["edit_date"], None, lambda post: post.edit_date),
+    "allow_comments": (["allow_comments"], None, lambda post: post.allow_comments),
+    "body": (["body"], None, lambda post: post.body),
+    "tags": ([], Prefetch('tags', models.Tag.objects.only('uid')),
+             lambda post: [tag.uid for tag in post.tags.all()]),
+    "authors": ([], Prefetch('authors', models.User.objects.only('username')),
+                lambda post: [author.username for author in post.authors.all()]),
+    "files": (["path"], Prefetch('files', models.File.objects.only('name')), files),
+    "comments": ([], Prefetch('comments', models.Comment.objects.filter(deleted=False, hidden=False)
+                              .select_related('author').only('body', 'date', 'author__name').order_by('date')),
+                 comments),
+}
+POST_DEFAULT_FIELDS = ["id", "title", "url", "date", "edit_date", "tags", "authors"]
+
+PAGE_FIELDS = {
+    "id": ([], None, lambda page: page.pk),
+    "uid": (["uid"], None, lambda page: page.uid),
+    "title": (["title"], None, lambda page: page.title),
+    "url": (["path"], None, lambda page: absolute(page.get_absolute_url())),
+    "edit_date": (["edit_date"], None, lambda page: page.edit_date),
+    "body": (["body"], None, lambda page: page.body),
+    "files": (["path"], Prefetch('files', models.File.objects.only('name')), files),
+}
+PAGE_DEFAULT_FIELDS = ["id", "uid", "title", "url", "edit_date"]
+
+TAG_FIELDS = {
+    "id": ([], None, lambda tag: tag.pk),
+    "uid": (["uid"], None, lambda tag: tag.uid),
+    "name": (["name"], None, lambda tag: tag.name),
+    "url": (["uid"], None, lambda tag: absolute(links.url('tag', tag.uid))),
+    "posts_count": (["published_posts_count"], None, lambda tag: tag.published_posts_count),
+}
+TAG_DEFAULT_FIELDS = list(TAG_FIELDS)
+
+AUTHOR_FIELDS = {
+    "id": ([], None, lambda user: user.pk),
+    "username": (["username"], None, lambda user: user.username),
+    "name": (["name"], None, lambda user: user.name),
+    "url": (["username"], None, lambda user: absolute(links.url('author', user.username))),
+    "bio": (["bio"], None, lambda user: user.bio),
+    "picture_url": (["picture_url", "hide_picture"], None,
+                    lambda user: None if user.hide_picture else user.picture_url),
+}
+AUTHOR_DEFAULT_FIELDS = list(AUTHOR_FIELDS)
+
+class BadRequest(Exception):
+    pass
+
+def requested_fields(request, available, default):
+    if not request.GET.get("fields"):
+        return default
+
+    names = [name.strip() for name in request.GET["fields"].split(",") if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise BadRequest("Unknown fields: {}".format(", ".join(unknown)))
+    return names
+
+def select(queryset, available, names, ordering=[]):
+    columns = {field.lstrip("-") for field in ordering} - {"pk"}
+    prefetches = []
+    for name in names:
+        field_columns, prefetch, value = available[name]
+        columns.update(field_columns)
+        if prefetch is not None:
+            prefetches.append(prefetch)
+
+    return queryset.only("pk", *columns).prefetch_related(*prefetches)
+
+def serialize(instance, available, names):
+    return {name: available[name][2](instance) for name in names}
+
+def page_size(request):
+    try:
+        size = int(request.GET.get("size", settings.API_PAGE_SIZE))
+    except ValueError:
+        raise BadRequest("Invalid size")
+    return max(1, min(size, settings.API_MAX_PAGE_SIZE))
+
+def respond(request, data, status=200):
+    response = JsonResponse(data, status=status, json_dumps_params={"separators": (",", ":")})
+    if status != 200:
+        return response
+
+    etag = quote_etag(hashlib.md5(response.content).hexdigest())
+    response['ETag'] = etag
+    return get_conditional_response(request, etag=etag, response=response)
+
+def api_view(view):
+    @functools.wraps(view)
+    def inner(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as e:
+            return respond(request, {"error": str(e)}, status=400)
+    return require_safe(inner)
+
+def listing(request, queryset, available, default, ordering):
+    names = requested_fields(request, available, default)
+    try:
+        rows, next_cursor, previous_cursor = pagination.paginate(
+            select(queryset, available, names, ordering), ordering, page_size(request),
+            request.GET.get("after"), request.GET.get("before"))
+    except pagination.InvalidCursor:
+        raise BadRequest("Invalid cursor")
+
+    return respond(request, {
+        "data": [serialize(row, available, names) for row in rows],
+        "next": next_cursor,
+        "previous": previous_cursor,
+    })
+
+def detail(request, queryset, available, default, pk):
+    names = requested_fields(request, available, default)
+    instance = select(queryset, available, names).filter(pk=pk).first()
+    if instance is None:
+        return respond(request, {"error": "Not found"}, status=404)
+
+    return respond(request, {"data": serialize(instance, available, names)})
+
+def published_posts():
+    return models.Post.objects.filter(draft__exact=False)
+
+@api_view
+def posts(request):
+    queryset = published_posts()
+    if request.GET.get("tag"):
+        queryset = queryset.filter(tags__uid=request.GET["tag"])
+    if request.GET.get("author"):
+        queryset = queryset.filter(authors__username=request.GET["author"])
+
+    return listing(request, queryset, POST_FIELDS, POST_DEFAULT_FIELDS, ["-date", "-pk"])
+
+@api_view
+def post(request, pk):
+    return detail(request, published_posts(), POST_FIELDS, POST_DEFAULT_FIELDS, pk)
+
+@api_view
+def pages(request):
+    return listing(request, models.Page.objects.all(), PAGE_FIELDS, PAGE_DEFAULT_FIELDS, ["pk"])
+
+@api_view
+def page(request, pk):
+    return detail(request, models.Page.objects.all(), PAGE_FIELDS, PAGE_DEFAULT_FIELDS, pk)
+
+@api_view
+def tags(request):
+    return listing(request, models.Tag.objects.filter(published_posts_count__gt=0),
+                   TAG_FIELDS, TAG_DEFAULT_FIELDS, ["name", "pk"])
+
+@api_view
+def authors(request):
+    queryset = models.User.objects.filter(
+        pk__in=PostAuthor.objects.filter(post__draft=False).values('user_id'))
+    return listing(request, queryset, AUTHOR_FIELDS, AUTHOR_DEFAULT_FIELDS, ["pk"])
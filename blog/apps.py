@@ -19,3 +19,16 @@ from django.apps import AppConfig
 
 class BlogConfig(AppConfig):
     name = 'code.blog'
+    
+    def ready(self):
+        # Connect signal receivers
+        from . import invalidation
+        from . import fragments
+        from . import sitemaps
+        from . import render_cache
+        from . import related
+        from . import archive
+        from . import tag_counts
+        from . import revisions
+        from . import file_gc
+        from . import sqlite
@@ -0,0 +1,85 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Published posts per month, kept in MonthlyPostCount as posts are
+# published, unpublished, moved to another date or deleted, so that the
+# archive never groups the posts table.
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from datetime import datetime
+import collections
+
+from . import models
+
+def month_range(year, month):
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+def add(date, delta):
+    updated = models.MonthlyPostCount.objects.filter(year=date.year, month=date.month) \
+        .update(count=F('count') + delta)
+
+    if not updated:
+        models.MonthlyPostCount.objects.get_or_create(year=date.year, month=date.month)
+        models.MonthlyPostCount.objects.filter(year=date.year, month=date.month) \
+            .update(count=F('count') + delta)
+
+def months():
+    return models.MonthlyPostCount.objects.filter(count__gt=0).order_by('-year', '-month')
+
+def years():
+    # Years with their months, newest first: [(year, count, [month, ...])]
+    grouped = collections.OrderedDict()
+    for month in months():
+        grouped.setdefault(month.year, []).append(month)
+
+    return [(year, sum(month.count for month in year_months), year_months)
+            for year, year_months in grouped.items()]
+
+def rebuild():
+    counts = models.Post.objects.filter(draft=False) \
+        .annotate(year=ExtractYear('date'), month=ExtractMonth('date')) \
+        .values('year', 'month').annotate(count=Count('pk')).order_by()
+
+    with transaction.atomic():
+        models.MonthlyPostCount.objects.all().delete()
+        models.MonthlyPostCount.objects.bulk_create(
+            models.MonthlyPostCount(year=row['year'], month=row['month'], count=row['count']) for row in counts)
+
+@receiver(post_save, sender=models.Post)
+def post_saved(sender, instance, created, **kwargs):
+    loaded = {} if created else getattr(instance, "_loaded_values", {})
+
+    was_published = "draft" in loaded and not loaded["draft"]
+    old_date = loaded.get("date", instance.date)
+
+    if was_published and (instance.draft or (old_date.year, old_date.month) != (instance.date.year, instance.date.month)):
+        add(old_date, -1)
+    if not instance.draft and (not was_published or (old_date.year, old_date.month) != (instance.date.year, instance.date.month)):
+        add(instance.date, 1)
+
+@receiver(post_delete, sender=models.Post)
+def post_deleted(sender, instance, **kwargs):
+    loaded = getattr(instance, "_loaded_values", {})
+
+    if not loaded.get("draft", instance.draft):
+        add(loaded.get("date", instance.date), -1)
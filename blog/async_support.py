@@ -0,0 +1,33 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import inspect
+
+def mark_coroutine(middleware):
+    # Tells Django that an async capable middleware instance must be
+    # awaited. asgiref.sync.markcoroutinefunction is only in asgiref 3.6+
+    # (Django 4.1+), older versions check asyncio.iscoroutinefunction.
+    try:
+        from asgiref.sync import markcoroutinefunction
+    except ImportError:
+        markcoroutinefunction = getattr(inspect, "markcoroutinefunction", None)
+
+    if markcoroutinefunction is not None:
+        markcoroutinefunction(middleware)
+    else:
+        middleware._is_coroutine = asyncio.coroutines._is_coroutine
@@ -0,0 +1,188 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Async versions of the read-heavy views, used when serving through
+# code.asgi (Django 4.1 or later). The view queries use the async ORM,
+# while templates (which may follow relations lazily) and session updates
+# still run in a thread through sync_to_async.
+
+from django.shortcuts import render
+from django.conf import settings as project_settings
+from django.db.models.functions import Length, Substr
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from datetime import datetime
+import mimetypes
+import django
+
+from . import models
+from . import settings
+from . import view_counts
+from . import links
+from .conditional import conditional, post_validators
+
+FILE_CHUNK_SIZE = 64 * 1024
+
+async def get_logged_user(request):
+    if "session_id" in request.COOKIES and (request.is_secure() or project_settings.DEBUG == True):
+        user_session_id = request.COOKIES.get("session_id").split("=")
+        if len(user_session_id) == 2 and len(user_session_id[1]) == 32:
+            user = await models.User.objects.filter(username=user_session_id[0]).afirst()
+            if user and user.session_id == user_session_id[1]:
+                return user
+
+    return None
+
+async def render_response(request, template_name, context, logged_user=None, **kwargs):
+    response = await sync_to_async(render)(request, template_name, context, **kwargs)
+
+    if logged_user:
+        await sync_to_async(logged_user.update_session_id)(response)
+
+    return response
+
+async def paginate(context, posts, page_number, posts_count=None):
+    ppp = settings.POSTS_PER_PAGE
+    if posts_count is None:
+        posts_count = await posts.acount()
+
+    if posts_count > ppp*page_number:
+        context["posts"] = [post async for post in posts.order_by('-date')[ppp*page_number:ppp*(page_number+1)]]
+
+        if page_number > 0:
+            context["next_posts"] = page_number - 1
+        if posts_count > ppp*(page_number+1):
+            context["prev_posts"] = page_number + 1
+
+async def index(request, page_number=0):
+    logged_user = await get_logged_user(request)
+
+    context = {
+        "page_number": page_number,
+        "logged_user": logged_user,
+        # Lazy, evaluated in the template thread only if shown
+        "popular_posts": view_counts.popular_posts(),
+    }
+    await paginate(context, models.Post.objects.filter(draft__exact=False), int(page_number))
+
+    return await render_response(request, "blog/index.html", context, logged_user)
+
+async def author(request, username, page_number=0):
+    logged_user = await get_logged_user(request)
+
+    author = await models.User.objects.filter(username=username).afirst()
+    if author is None:
+        raise Http404()
+
+    context = {
+        "author": author,
+        "page_number": page_number,
+        "logged_user": logged_user,
+    }
+    await paginate(context, author.posts.filter(draft__exact=False), int(page_number))
+
+    return await render_response(request, "blog/author.html", context, logged_user)
+
+async def tag(request, tag_uid, page_number=0):
+    logged_user = await get_logged_user(request)
+
+    tag = await models.Tag.objects.filter(uid=tag_uid).afirst()
+    if tag is None:
+        raise Http404()
+
+    context = {
+        "tag": tag,
+        "page_number": page_number,
+        "logged_user": logged_user,
+    }
+    await paginate(context, tag.posts.filter(draft__exact=False), int(page_number), tag.published_posts_count)
+
+    return await render_response(request, "blog/tag.html", context, logged_user)
+
+@conditional(post_validators)
+async def post(request, year, month, uid):
+    logged_user = await get_logged_user(request)
+
+    post = await models.Post.objects.filter(path=links.post_path(year, month, uid)).afirst()
+    if post is None:
+        raise Http404()
+
+    return await render_response(request, "blog/post.html", {
+        "post": post,
+        "logged_user": logged_user
+    }, logged_user)
+
+async def file_chunks(pk, length):
+    # A query per chunk, so that large files are never whole in memory
+    for start in range(0, length, FILE_CHUNK_SIZE):
+        chunk = await models.File.objects.filter(pk=pk).annotate(
+            chunk=Substr('content', start + 1, FILE_CHUNK_SIZE)).values_list('chunk', flat=True).afirst()
+        yield bytes(chunk)
+
+async def file_response(files, filename):
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    # Async iterators can be streamed from Django 4.2, before it the file
+    # is sent whole
+    if django.VERSION < (4, 2):
+        f = await files.only('content').filter(name=filename).afirst()
+        if f is None:
+            raise Http404()
+        return HttpResponse(content=f.content, content_type=content_type)
+
+    f = await files.only('pk').annotate(length=Length('content')).filter(name=filename).afirst()
+    if f is None:
+        raise Http404()
+
+    response = StreamingHttpResponse(file_chunks(f.pk, f.length or 0), content_type=content_type)
+    response['Content-Length'] = f.length or 0
+    return response
+
+async def post_file(request, year, month, uid, filename):
+    post = await models.Post.objects.filter(path=links.post_path(year, month, uid)).afirst()
+    if post is None:
+        raise Http404()
+
+    return await file_response(post.files.all(), filename)
+
+async def page_file(request, uid, filename):
+    page = await models.Page.objects.filter(path=links.page_path(uid)).afirst()
+    if page is None:
+        raise Http404()
+
+    return await file_response(page.files.all(), filename)
+
+async def feed(request, tag_uid=None, username=None):
+    context = {}
+
+    if username:
+        author = await models.User.objects.filter(username=username).afirst()
+        if author is None:
+            raise Http404()
+        posts = author.posts.all()
+    elif tag_uid:
+        tag = await models.Tag.objects.filter(uid=tag_uid).afirst()
+        if tag is None:
+            raise Http404()
+        posts = tag.posts.all()
+    else:
+        posts = models.Post.objects.all()
+
+    context["posts"] = [post async for post in posts.filter(draft__exact=False).order_by('-date')[0:settings.ATOM_POSTS]]
+    context["updated"] = datetime.utcnow() if len(context["posts"]) == 0 else context["posts"][0].date
+
+    return await render_response(request, "blog/atom.xml", context, content_type="application/atom+xml")
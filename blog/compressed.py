@@ -0,0 +1,173 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Text stored compressed in a binary column. The first byte tells how the
+# rest is stored, so that rows written with different settings can be
+# read back: changing body_compression only affects the next writes
+# (manage.py compress_bodies rewrites everything).
+#
+# Rows are decoded lazily: the stored bytes stay on the instance until the
+# attribute is first read, so listings that load a body but never show it
+# don't pay for decompressing it. Decoded bodies are kept in a per-process
+# LRU keyed by model, primary key, edit date and stored size, so the same
+# body read again (the index, then the feed, then the post page...) is
+# decompressed once, without hashing the blob to find it.
+
+from django import forms
+from django.db import models
+import collections
+import threading
+import zlib
+
+from . import settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+RAW = b"\x00"
+ZLIB = b"z"
+ZSTD = b"s"
+
+def encode(text):
+    data = text.encode("utf-8")
+
+    if len(data) >= settings.BODY_COMPRESSION_MIN_SIZE:
+        if settings.BODY_COMPRESSION == "zstd" and zstandard:
+            return ZSTD + zstandard.ZstdCompressor(level=10).compress(data)
+        if settings.BODY_COMPRESSION in ["zlib", "zstd"]:
+            return ZLIB + zlib.compress(data, 6)
+
+    return RAW + data
+
+# Set on every document with a compressed body, changed by each edit
+VERSION_FIELD = "edit_date"
+
+cache = collections.OrderedDict()
+cache_lock = threading.Lock()
+
+class Encoded(bytes):
+    # A value as loaded from the database, not decoded yet
+    pass
+
+def decode(data):
+    kind, data = data[:1], data[1:]
+
+    if kind == ZLIB:
+        data = zlib.decompress(data)
+    elif kind == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Bodies compressed with zstd need the zstandard module")
+        data = zstandard.ZstdDecompressor().decompress(data)
+
+    return data.decode("utf-8")
+
+def cache_key(instance, data):
+    # The version as loaded, edits may have changed the attribute since.
+    # The size catches an edit that forced the edit date back.
+    loaded = getattr(instance, "_loaded_values", None) or instance.__dict__
+    version = loaded.get(VERSION_FIELD)
+    if instance.pk is None or version is None:
+        return None
+    return (instance._meta.label, instance.pk, version, len(data))
+
+def cached_decode(instance, data):
+    key = cache_key(instance, data)
+    if key is None or settings.BODY_CACHE_SIZE <= 0:
+        return decode(data)
+
+    with cache_lock:
+        text = cache.get(key)
+        if text is not None:
+            cache.move_to_end(key)
+            return text
+
+    text = decode(data)
+
+    with cache_lock:
+        cache[key] = text
+        while len(cache) > settings.BODY_CACHE_SIZE:
+            cache.popitem(last=False)
+
+    return text
+
+class CompressedTextDescriptor():
+    # Wraps the descriptor Django installs (which loads deferred fields)
+    # and decodes the loaded value once, on first access
+
+    def __init__(self, field, descriptor):
+        self.field = field
+        self.descriptor = descriptor
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+
+        value = self.descriptor.__get__(instance, cls)
+        if isinstance(value, Encoded):
+            value = instance.__dict__[self.field.attname] = cached_decode(instance, value)
+        return value
+
+    # A data descriptor, so that reads go through __get__ even once the
+    # value is in the instance's __dict__
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+class CompressedTextField(models.BinaryField):
+    # Holds a str like TextField, only the column is binary
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("editable", True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get("editable") is True:
+            del kwargs["editable"]
+        return name, path, args, kwargs
+
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super().contribute_to_class(cls, name, *args, **kwargs)
+        setattr(cls, self.attname, CompressedTextDescriptor(self, cls.__dict__[self.attname]))
+
+    def get_default(self):
+        default = super().get_default()
+        return "" if default == b"" else default
+
+    def from_db_value(self, value, expression, connection):
+        # Decoded by the descriptor. values() and values_list() return the
+        # Encoded bytes, decode() them if needed.
+        if value is None:
+            return value
+        return Encoded(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return decode(bytes(value))
+
+    def get_prep_value(self, value):
+        if isinstance(value, str):
+            return encode(value)
+        return super().get_prep_value(value)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{"widget": forms.Textarea, **kwargs})
@@ -0,0 +1,136 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+from django.core.cache import cache
+from django.utils.cache import has_vary_header, patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+import hashlib
+import gzip
+import re
+
+from . import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Everything else (images, archives, video...) is either already
+# compressed or not worth it
+COMPRESSIBLE_TYPES = [
+    "text/",
+    "application/xml",
+    "application/atom+xml",
+    "application/rss+xml",
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+]
+
+def is_compressible(content_type):
+    content_type = content_type.split(";")[0].strip().lower()
+    return any(content_type.startswith(t) for t in COMPRESSIBLE_TYPES)
+
+def accepted_encodings(accept_encoding):
+    encodings = {}
+    for item in accept_encoding.split(","):
+        parts = item.strip().split(";")
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        encodings[parts[0].strip().lower()] = quality
+    return encodings
+
+def choose_encoding(accept_encoding):
+    encodings = accepted_encodings(accept_encoding)
+    candidates = (["br"] if brotli else []) + ["gzip"]
+
+    for encoding in candidates:
+        if encodings.get(encoding, encodings.get("*", 0)) > 0:
+            return encoding
+    return None
+
+def compress(content, encoding):
+    if encoding == "br":
+        return brotli.compress(content, quality=5)
+    return gzip.compress(content, 6)
+
+def is_shared(request, response):
+    # Only responses any anonymous visitor could get go through the cache:
+    # none setting cookies, private, or varying on the cookies this
+    # request sent
+    if response.cookies:
+        return False
+
+    cache_control = response.get("Cache-Control", "").lower()
+    if "private" in cache_control or "no-store" in cache_control:
+        return False
+
+    return not (request.COOKIES and has_vary_header(response, "Cookie"))
+
+def cached_compress(content, encoding, shared):
+    # Identical responses (cached pages, feeds, rendered fragments) are
+    # compressed once and shared through the cache
+    if not shared or len(content) > settings.COMPRESSION_CACHE_MAX_SIZE:
+        return compress(content, encoding)
+
+    key = "compressed:{}:{}".format(encoding, hashlib.md5(content).hexdigest())
+    compressed = cache.get(key)
+    if compressed is None:
+        compressed = compress(content, encoding)
+        cache.set(key, compressed, settings.COMPRESSION_CACHE_TIMEOUT)
+    return compressed
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        if response.streaming or response.status_code != 200 or response.has_header("Content-Encoding"):
+            return response
+
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        if not is_compressible(response.get("Content-Type", "")):
+            return response
+
+        # Compressed pages holding the CSRF token give it away to BREACH
+        if request.META.get("CSRF_COOKIE_USED"):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        encoding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        compressed = cached_compress(response.content, encoding, is_shared(request, response))
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+
+        # The representation changed, strong ETags are no longer valid
+        if response.has_header("ETag"):
+            response["ETag"] = re.sub(r'^(W/)?"', 'W/"', response["ETag"])
+
+        return response
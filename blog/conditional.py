@@ -0,0 +1,119 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+from django.db.models import Count, Max, Q
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from datetime import datetime
+import functools
+import calendar
+import hashlib
+import asyncio
+
+from . import models
+from . import links
+from . import fragments
+
+def viewer(request):
+    # Pages differ between visitors and logged users, the username part of
+    # the session cookie is enough to tell them apart
+    session_id = request.COOKIES.get("session_id")
+    return session_id.split("=")[0] if session_id else ""
+
+def make_validators(request, kind, pk, *dates_and_counters):
+    # The sidebars show other posts, so any site-wide change counts too
+    dates_and_counters += (datetime.utcfromtimestamp(fragments.site_version() / 1000000),)
+    dates = [d for d in dates_and_counters if hasattr(d, "timetuple")]
+    last_modified = max(dates) if dates else None
+
+    etag = hashlib.md5("{}:{}:{}:{}".format(
+        kind, pk, ":".join(str(v) for v in dates_and_counters), viewer(request)).encode("utf-8")).hexdigest()
+
+    # If-Modified-Since can't tell visitors and logged users apart, only
+    # the ETag is used for logged users
+    if viewer(request):
+        last_modified = None
+
+    return quote_etag(etag), last_modified
+
+def post_validators(request, year, month, uid):
+    post = models.Post.objects.filter(path=links.post_path(year, month, uid)) \
+        .annotate(last_comment=Max('comments__date'),
+                  comments_count=Count('comments'),
+                  hidden_comments=Count('comments', filter=Q(comments__deleted=True) | Q(comments__hidden=True))) \
+        .values('pk', 'edit_date', 'last_comment', 'comments_count', 'hidden_comments').first()
+
+    if post is None:
+        return None, None
+
+    return make_validators(request, "post", post['pk'], post['edit_date'], post['last_comment'],
+                           post['comments_count'], post['hidden_comments'])
+
+def page_validators(request, uid):
+    page = models.Page.objects.filter(path=links.page_path(uid)).values('pk', 'edit_date').first()
+
+    if page is None:
+        return None, None
+
+    return make_validators(request, "page", page['pk'], page['edit_date'])
+
+def not_modified(request, etag, last_modified):
+    if request.method not in ["GET", "HEAD"] or etag is None:
+        return None
+
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=calendar.timegm(last_modified.utctimetuple()) if last_modified else None)
+
+def set_validators(response, etag, last_modified):
+    if response.status_code == 200 and etag is not None:
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(calendar.timegm(last_modified.utctimetuple()))
+
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+def conditional(validators):
+    # Like django.views.decorators.http.condition, with a single metadata
+    # query for both validators, and usable on async views too
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_inner(request, *args, **kwargs):
+                from asgiref.sync import sync_to_async
+
+                etag, last_modified = await sync_to_async(validators)(request, *args, **kwargs)
+                response = not_modified(request, etag, last_modified)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return set_validators(response, etag, last_modified)
+
+            return async_inner
+
+        @functools.wraps(view)
+        def inner(request, *args, **kwargs):
+            etag, last_modified = validators(request, *args, **kwargs)
+            response = not_modified(request, etag, last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return set_validators(response, etag, last_modified)
+
+        return inner
+
+    return decorator
@@ -0,0 +1,125 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Mark and sweep of File rows no post or page links to any more (deleted
+# posts, interrupted uploads, restores). Files are scanned by primary key
+# in batches, reading only their keys; the links of each batch are looked
+# up, and the unlinked ones are deleted in a short transaction that checks
+# the links again, in case a post picked a file up in the meantime.
+#
+# A file is saved before being linked to its post, so files younger than
+# FILE_GC_GRACE_PERIOD are never collected. Collections run after posts
+# and pages are deleted, and in each process every FILE_GC_INTERVAL
+# seconds after a request (or from cron with manage.py collect_files).
+
+from django.core.signals import request_finished
+from django.db import transaction, close_old_connections
+from django.db.models import Count, Sum
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from datetime import datetime, timedelta
+import threading
+import logging
+import time
+
+from . import models
+from . import settings
+from .sqlite import retry_when_locked
+
+PostFile = models.Post.files.through
+PageFile = models.Page.files.through
+
+logger = logging.getLogger("code.blog.file_gc")
+
+running = threading.Lock()
+
+last_collection = time.monotonic()
+
+def linked(file_pks):
+    return set(PostFile.objects.filter(file_id__in=file_pks).values_list('file_id', flat=True)) | \
+        set(PageFile.objects.filter(file_id__in=file_pks).values_list('file_id', flat=True))
+
+@retry_when_locked
+def delete_orphans(candidates, dry_run):
+    orphans = models.File.objects.filter(pk__in=candidates) \
+        .exclude(pk__in=PostFile.objects.values('file_id')) \
+        .exclude(pk__in=PageFile.objects.values('file_id'))
+
+    found = orphans.aggregate(count=Count('pk'), size=Sum('size'))
+    if not dry_run:
+        # Without only() the blobs would be loaded to be deleted
+        orphans.only('pk').delete()
+    return found
+
+def delete_unlinked(file_pks):
+    # For files a view has just unlinked, no grace period: the links are
+    # checked again in the delete
+    return delete_orphans(set(file_pks), False)
+
+def collect(dry_run=False, batch_size=None):
+    # Returns the number of unlinked files and their size in bytes
+    batch_size = batch_size or settings.FILE_GC_BATCH_SIZE
+    before = datetime.utcnow() - timedelta(seconds=settings.FILE_GC_GRACE_PERIOD)
+
+    collected = 0
+    reclaimed = 0
+    last_pk = 0
+
+    while True:
+        batch = list(models.File.objects.filter(pk__gt=last_pk, date__lt=before)
+                     .order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return collected, reclaimed
+        last_pk = batch[-1]
+
+        candidates = set(batch) - linked(batch)
+        if not candidates:
+            continue
+
+        found = delete_orphans(candidates, dry_run)
+        collected += found["count"]
+        reclaimed += found["size"] or 0
+
+def run():
+    try:
+        collected, reclaimed = collect()
+        if collected:
+            logger.info("Deleted {} unlinked files, {} bytes".format(collected, reclaimed))
+    except Exception:
+        logger.exception("Collecting the unlinked files failed")
+    finally:
+        close_old_connections()
+        running.release()
+
+def collect_in_background():
+    global last_collection
+
+    # One collection at a time, a request for another while one is running
+    # is covered by it
+    if settings.FILE_GC_BACKGROUND and running.acquire(blocking=False):
+        last_collection = time.monotonic()
+        threading.Thread(target=run, name="file-gc", daemon=True).start()
+
+@receiver(request_finished)
+def request_finished_receiver(**kwargs):
+    if settings.FILE_GC_INTERVAL > 0 and time.monotonic() - last_collection > settings.FILE_GC_INTERVAL:
+        collect_in_background()
+
+@receiver(post_delete, sender=models.Post)
+@receiver(post_delete, sender=models.Page)
+def document_deleted(sender, instance, **kwargs):
+    transaction.on_commit(collect_in_background)
@@ -0,0 +1,133 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+import hashlib
+import time
+
+from . import models
+from . import settings
+from . import invalidation
+
+def version_key(kind, pk):
+    return "fragment_version:{}:{}".format(kind, pk)
+
+def new_version():
+    # Counters start from the current time so that a counter lost by the
+    # cache never goes back to a value used by an older fragment
+    return int(time.time() * 1000000)
+
+def bump(kind, pks):
+    for pk in pks:
+        key = version_key(kind, pk)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, new_version(), None)
+
+def versions(post):
+    keys = [version_key("post", post.pk), version_key("comments", post.pk)]
+    values = cache.get_many(keys)
+
+    for key in keys:
+        if key not in values:
+            values[key] = new_version()
+            cache.add(key, values[key], None)
+
+    return [values[key] for key in keys]
+
+def site_changed():
+    # A time rather than a counter, so that it can be a Last-Modified date
+    cache.set(version_key("site", 0), new_version(), None)
+
+def site_version():
+    # Changes that show on other pages than their own: related posts, the
+    # archive sidebar, the tag cloud
+    key = version_key("site", 0)
+    value = cache.get(key)
+    if value is None:
+        value = new_version()
+        if not cache.add(key, value, None):
+            value = cache.get(key, value)
+    return value
+
+def fragment_key(name, post, vary_on=()):
+    key = "fragment:{}:{}:{}:{}:{}".format(
+        name, post.pk, post.edit_date.timestamp(), *versions(post))
+
+    if vary_on:
+        key += ":" + hashlib.md5(":".join(str(v) for v in vary_on).encode("utf-8")).hexdigest()
+
+    return key
+
+def get_or_render(name, post, render, vary_on=()):
+    key = fragment_key(name, post, vary_on)
+
+    content = cache.get(key)
+    if content is None:
+        content = render()
+        cache.set(key, content, settings.FRAGMENT_CACHE_TIMEOUT)
+
+    return content
+
+@receiver(post_save, sender=models.Post)
+@receiver(post_delete, sender=models.Post)
+def post_changed(sender, instance, **kwargs):
+    bump("post", [instance.pk])
+    site_changed()
+
+def changed_posts(field, instance, action, reverse, pk_set):
+    # With reverse relations the changed posts are in pk_set, except on
+    # clear where they have to be read before the relation is emptied
+    if not reverse:
+        return [instance.pk] if action.startswith("post_") else []
+    if action == "pre_clear":
+        return models.Post.objects.filter(**{field: instance}).values_list("pk", flat=True)
+    if action in ["post_add", "post_remove"]:
+        return pk_set
+    return []
+
+@receiver(post_save, sender=models.Comment)
+@receiver(pre_delete, sender=models.Comment)
+def comment_changed(sender, instance, **kwargs):
+    bump("comments", models.Post.objects.filter(comments=instance).values_list("pk", flat=True))
+
+@receiver(m2m_changed, sender=models.Post.comments.through)
+def post_comments_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    bump("comments", changed_posts("comments", instance, action, reverse, pk_set))
+
+@receiver(m2m_changed, sender=models.Post.tags.through)
+def post_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    bump("post", changed_posts("tags", instance, action, reverse, pk_set))
+    if action.startswith("post_"):
+        site_changed()
+
+@receiver(post_save, sender=models.Tag)
+@receiver(pre_delete, sender=models.Tag)
+def tag_changed(sender, instance, **kwargs):
+    bump("post", instance.posts.values_list("pk", flat=True))
+    site_changed()
+
+# Changes made by other processes, which matter when the cache is local to
+# each process
+invalidation.subscribe("post", lambda pk: bump("post", [pk]))
+invalidation.subscribe("post", lambda pk: site_changed())
+invalidation.subscribe("comment", lambda pk: bump("comments", models.Post.objects.filter(comments__pk=pk).values_list("pk", flat=True)))
+invalidation.subscribe("tag", lambda pk: bump("post", models.Post.objects.filter(tags__pk=pk).values_list("pk", flat=True)))
+invalidation.subscribe("tag", lambda pk: site_changed())
@@ -0,0 +1,197 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Propagates model changes to the other worker processes, so that they can
+# evict what they cache in memory. Events go through PostgreSQL
+# LISTEN/NOTIFY, or through the InvalidationEvent table polled by every
+# worker on other databases.
+#
+# Modules caching data register a callback with subscribe(); the callback
+# receives the pk of the changed object and only runs for changes made by
+# other processes, local changes are handled by the usual signals.
+
+from django.core.signals import request_started
+from django.db import connections, transaction, close_old_connections
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from datetime import datetime, timedelta
+import collections
+import itertools
+import threading
+import logging
+import select
+import json
+import time
+import os
+
+from . import models
+from . import settings
+
+CHANNEL = "blog_invalidation"
+
+MODELS = {
+    "post": models.Post,
+    "page": models.Page,
+    "tag": models.Tag,
+    "comment": models.Comment,
+    "user": models.User,
+    "file": models.File,
+}
+
+logger = logging.getLogger("code.blog.invalidation")
+
+# Random per process: workers forked from a preloaded master must not share it
+origins = {}
+
+def current_origin():
+    return origins.setdefault(os.getpid(), os.urandom(16).hex())
+
+# Events of each process are numbered, so that repeated or out of order
+# events can be recognized without comparing the clocks of different dynos
+counter = itertools.count(1)
+publish_lock = threading.Lock()
+
+# Last version seen from each origin
+versions = {}
+
+subscribers = collections.defaultdict(list)
+
+listener = None
+listener_pid = None
+listener_lock = threading.Lock()
+
+def subscribe(model, callback):
+    subscribers[model].append(callback)
+
+def is_postgresql():
+    return connections["default"].vendor == "postgresql"
+
+def publish(model, pk):
+    # Sent under the lock so that versions reach the bus in order
+    with publish_lock:
+        version = next(counter)
+
+        if is_postgresql():
+            payload = json.dumps({
+                "model": model,
+                "pk": pk,
+                "origin": current_origin(),
+                "version": version,
+            })
+            with connections["default"].cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+        else:
+            models.InvalidationEvent.objects.create(model=model, object_pk=pk, origin=current_origin(), version=version)
+
+def dispatch(model, pk, event_origin, version):
+    if event_origin == current_origin():
+        return
+
+    if versions.get(event_origin, 0) >= version:
+        return
+    versions[event_origin] = version
+
+    for callback in subscribers[model]:
+        try:
+            callback(pk)
+        except Exception:
+            logger.exception("Invalidation of %s %s failed", model, pk)
+
+def listen_postgresql():
+    db = connections["default"]
+    conn = db.get_new_connection(db.get_connection_params())
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("LISTEN {}".format(CHANNEL))
+
+        while True:
+            if select.select([conn], [], [], 60) == ([], [], []):
+                continue
+
+            conn.poll()
+            while conn.notifies:
+                event = json.loads(conn.notifies.pop(0).payload)
+                dispatch(event["model"], event["pk"], event["origin"], event["version"])
+                close_old_connections()
+    finally:
+        conn.close()
+
+def last_event():
+    return models.InvalidationEvent.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+def poll(last):
+    # Dispatches the events following the given one, returns the last
+    for event in models.InvalidationEvent.objects.filter(pk__gt=last).order_by('pk'):
+        dispatch(event.model, event.object_pk, event.origin, event.version)
+        last = event.pk
+    return last
+
+def poll_table():
+    last = last_event()
+    last_prune = time.monotonic()
+
+    while True:
+        time.sleep(settings.INVALIDATION_POLL_INTERVAL)
+        close_old_connections()
+
+        last = poll(last)
+
+        if time.monotonic() - last_prune > settings.INVALIDATION_RETENTION / 10:
+            models.InvalidationEvent.objects.filter(
+                date__lt=datetime.utcnow() - timedelta(seconds=settings.INVALIDATION_RETENTION)).delete()
+            last_prune = time.monotonic()
+
+def run_listener():
+    while True:
+        try:
+            if is_postgresql():
+                listen_postgresql()
+            else:
+                poll_table()
+        except Exception:
+            logger.exception("Invalidation listener failed, restarting")
+            connections.close_all()
+            time.sleep(5)
+
+@receiver(request_started)
+def start_listener(**kwargs):
+    global listener, listener_pid
+
+    # Started by the first request of each process, after any fork
+    if not settings.INVALIDATION_BUS or listener_pid == os.getpid():
+        return
+
+    with listener_lock:
+        if listener_pid != os.getpid():
+            listener = threading.Thread(target=run_listener, name="invalidation-listener", daemon=True)
+            listener.start()
+            listener_pid = os.getpid()
+
+def model_changed(sender, instance, **kwargs):
+    model = sender._meta.model_name
+
+    # Nobody caches users or files yet: skip the events, users are saved by
+    # every request of a logged user
+    if settings.INVALIDATION_BUS and subscribers[model]:
+        pk = instance.pk
+        transaction.on_commit(lambda: publish(model, pk))
+
+for model_class in MODELS.values():
+    post_save.connect(model_changed, sender=model_class, dispatch_uid="invalidation_save")
+    post_delete.connect(model_changed, sender=model_class, dispatch_uid="invalidation_delete")
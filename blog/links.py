@@ -0,0 +1,52 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# URL building for the hot routes. reverse() walks the URL patterns on every
+# call; the URLs of posts, tags, authors and files are built over and over
+# by listings and feeds, so they are memoized per script prefix.
+#
+# Post.path and Page.path store the canonical path of each document without
+# the script prefix, as built by post_path() and page_path(), so that posts
+# are looked up by an indexed column and their URLs need no reversing.
+# These two format the path instead of reversing it: they are called with
+# whatever a request asked for, and caching those would let probes for
+# missing posts push the real URLs out of the cache. They have to follow
+# the 'post' and 'page' patterns in urls.py.
+
+from django.urls import reverse, get_script_prefix
+import functools
+
+from . import settings
+
+@functools.lru_cache(maxsize=settings.URL_CACHE_SIZE)
+def cached_reverse(prefix, name, args):
+    return reverse(name, args=args)
+
+def url(name, *args):
+    return cached_reverse(get_script_prefix(), name, tuple(str(arg) for arg in args))
+
+def strip_prefix(url):
+    return "/" + url[len(get_script_prefix()):]
+
+def add_prefix(path):
+    return get_script_prefix() + path[1:]
+
+def post_path(year, month, uid):
+    return "/{}/{:02d}/{}/".format(int(year), int(month), uid)
+
+def page_path(uid):
+    return "/{}/".format(uid)
@@ -0,0 +1,31 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from django.core.management.base import BaseCommand
+
+from ... import file_gc
+
+class Command(BaseCommand):
+    help = "Deletes the files no post or page links to"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+        parser.add_argument("--batch-size", type=int, default=None, help="Files examined per query")
+
+    def handle(self, *args, **options):
+        collected, reclaimed = file_gc.collect(dry_run=options["dry_run"], batch_size=options["batch_size"])
+        self.stdout.write("{} {} unlinked files, {} bytes".format(
+            "Found" if options["dry_run"] else "Deleted", collected, reclaimed))
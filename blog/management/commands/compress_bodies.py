@@ -0,0 +1,31 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from django.core.management.base import BaseCommand
+
+from ... import models
+
+class Command(BaseCommand):
+    help = "Stores every post and page body again with the current body_compression setting"
+
+    def handle(self, *args, **options):
+        count = 0
+        for model in [models.Post, models.Page]:
+            for document in model.objects.only('pk', 'body').iterator():
+                # update() doesn't touch edit dates or send signals
+                model.objects.filter(pk=document.pk).update(body=document.body)
+                count += 1
+        self.stdout.write("Stored {} bodies".format(count))
@@ -0,0 +1,214 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.urls import reverse
+from django.db.models import Count, Max
+from concurrent.futures import ProcessPoolExecutor
+import mimetypes
+import shutil
+import django
+import gzip
+import json
+import os
+
+from ... import models
+from ... import prerender
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = ".export_manifest.json"
+
+COMPRESSIBLE_TYPES = [
+    "text/html",
+    "text/plain",
+    "text/css",
+    "text/xml",
+    "application/xml",
+    "application/atom+xml",
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+]
+
+def output_filename(output, path, response):
+    if path.endswith("/"):
+        content_type = response.get("Content-Type", "")
+        filename = "index.xml" if "xml" in content_type and "html" not in content_type else "index.html"
+        return os.path.join(output, path.strip("/"), filename)
+
+    return os.path.join(output, path.lstrip("/"))
+
+def write_file(filename, content):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(content)
+    os.replace(tmp_filename, filename)
+
+def write_server_config(output):
+    # Static servers only look for index.html in a directory, the feeds are
+    # written as index.xml: Apache is told with DirectoryIndex, Netlify and
+    # Cloudflare Pages with rewrites (nginx needs "index index.html
+    # index.xml;" in its configuration)
+    write_file(os.path.join(output, ".htaccess"), b"DirectoryIndex index.html index.xml\n")
+
+    feeds = [reverse('feed'),
+             reverse('tag_feed', kwargs={"tag_uid": ":tag"}),
+             reverse('author_feed', kwargs={"username": ":username"})]
+    rules = "".join("{} {}index.xml 200\n".format(feed, feed) for feed in feeds)
+    write_file(os.path.join(output, "_redirects"), rules.encode("utf-8"))
+
+def export(output, path):
+    response = prerender.render_path(path)
+    if response is None:
+        return False
+
+    filename = output_filename(output, path, response)
+    write_file(filename, response.content)
+
+    # Precompressed variants picked up by whitenoise and most static servers
+    if mimetypes.guess_type(filename)[0] in COMPRESSIBLE_TYPES:
+        write_file(filename + ".gz", gzip.compress(response.content, 9))
+        if brotli:
+            write_file(filename + ".br", brotli.compress(response.content))
+
+    return True
+
+def export_shard(output, paths):
+    try:
+        return sum(1 for path in paths if export(output, path))
+    finally:
+        connections.close_all()
+
+def init_worker():
+    django.setup()
+
+def site_state():
+    state = {"posts": {}, "pages": {}}
+
+    posts = models.Post.objects.filter(draft__exact=False) \
+        .annotate(comments_count=Count('comments'), last_comment=Max('comments__date')) \
+        .prefetch_related('tags', 'authors', 'files').defer('body')
+
+    for post in posts:
+        state["posts"][str(post.pk)] = {
+            "signature": "{}|{}|{}|{}".format(post.edit_date, post.comments_count, post.last_comment,
+                                              ",".join(sorted(f.name for f in post.files.all()))),
+            "path": prerender.post_url(post),
+            "tags": [tag.uid for tag in post.tags.all()],
+            "authors": [author.username for author in post.authors.all()],
+        }
+
+    for page in models.Page.objects.prefetch_related('files').defer('body'):
+        state["pages"][str(page.pk)] = {
+            "signature": "{}|{}".format(page.edit_date, ",".join(sorted(f.name for f in page.files.all()))),
+            "path": prerender.page_paths(page)[0],
+        }
+
+    return state
+
+def changed_paths(old_state, state):
+    paths = []
+    removed = []
+    tags = set()
+    authors = set()
+
+    for pk, post in state["posts"].items():
+        old_post = old_state["posts"].get(pk)
+        if old_post is None or old_post["signature"] != post["signature"] or old_post["path"] != post["path"]:
+            paths += prerender.affected_paths(models.Post.objects.get(pk=int(pk)))
+            if old_post:
+                tags.update(old_post["tags"])
+                authors.update(old_post["authors"])
+                if old_post["path"] != post["path"]:
+                    removed.append(old_post["path"])
+
+    for pk, old_post in old_state["posts"].items():
+        if pk not in state["posts"]:
+            removed.append(old_post["path"])
+            paths += prerender.index_paths()
+            tags.update(old_post["tags"])
+            authors.update(old_post["authors"])
+
+    # Tags and authors the changed posts have been removed from
+    for tag in models.Tag.objects.filter(uid__in=tags):
+        paths += prerender.tag_paths(tag)
+    for author in models.User.objects.filter(username__in=authors):
+        paths += prerender.author_paths(author)
+
+    for pk, page in state["pages"].items():
+        old_page = old_state["pages"].get(pk)
+        if old_page is None or old_page["signature"] != page["signature"] or old_page["path"] != page["path"]:
+            paths += prerender.page_paths(models.Page.objects.get(pk=int(pk)))
+            if old_page and old_page["path"] != page["path"]:
+                removed.append(old_page["path"])
+
+    for pk, old_page in old_state["pages"].items():
+        if pk not in state["pages"]:
+            removed.append(old_page["path"])
+
+    return paths, removed
+
+class Command(BaseCommand):
+    help = "Renders the public site to a directory that any static file server can serve"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Output directory")
+        parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                            help="Number of rendering processes")
+        parser.add_argument("--incremental", action="store_true",
+                            help="Only render the pages affected by changes since the last export")
+
+    def handle(self, *args, **options):
+        output = os.path.abspath(options["output"])
+        manifest = os.path.join(output, MANIFEST)
+
+        state = site_state()
+
+        if options["incremental"] and os.path.exists(manifest):
+            with open(manifest, "r") as f:
+                old_state = json.load(f)
+            paths, removed = changed_paths(old_state, state)
+        else:
+            paths, removed = prerender.all_paths(), []
+
+        for path in removed:
+            shutil.rmtree(os.path.join(output, path.strip("/")), ignore_errors=True)
+
+        # Remove duplicates keeping the order
+        paths = list(dict.fromkeys(paths))
+
+        jobs = max(1, min(options["jobs"], len(paths)))
+        if jobs == 1:
+            exported = export_shard(output, paths)
+        else:
+            shards = [paths[n::jobs * 4] for n in range(jobs * 4)]
+
+            # Forked workers must not share the parent's connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as executor:
+                exported = sum(executor.map(export_shard, [output] * len(shards), shards))
+
+        write_server_config(output)
+        write_file(manifest, json.dumps(state).encode("utf-8"))
+
+        self.stdout.write("Exported {} of {} paths to {}".format(exported, len(paths), output))
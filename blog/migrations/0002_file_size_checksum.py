@@ -0,0 +1,34 @@
+# Generated by Django 2.2.28 on 2026-10-19 18:42
+
+from django.db import migrations, models
+import hashlib
+
+
+def fill_size_checksum(apps, schema_editor):
+    File = apps.get_model('blog', 'File')
+    for f in File.objects.iterator():
+        content = bytes(f.content)
+        f.size = len(content)
+        f.checksum = hashlib.sha256(content).hexdigest()
+        f.save(update_fields=['size', 'checksum'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_squashed_0008_auto_20170913_1010'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='checksum',
+            field=models.CharField(default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='size',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_size_checksum, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.28 on 2026-10-19 18:48
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_file_size_checksum'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvalidationEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50)),
+                ('object_pk', models.IntegerField()),
+                ('origin', models.CharField(max_length=32)),
+                ('version', models.BigIntegerField()),
+                ('date', models.DateTimeField(db_index=True, default=datetime.datetime.utcnow)),
+            ],
+        ),
+    ]
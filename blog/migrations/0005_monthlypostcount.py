@@ -0,0 +1,38 @@
+# Generated by Django 2.2.28 on 2026-10-19 18:56
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def fill_monthly_post_counts(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    MonthlyPostCount = apps.get_model('blog', 'MonthlyPostCount')
+    counts = Post.objects.filter(draft=False) \
+        .annotate(year=ExtractYear('date'), month=ExtractMonth('date')) \
+        .values('year', 'month').annotate(count=Count('pk')).order_by()
+    MonthlyPostCount.objects.bulk_create(
+        MonthlyPostCount(year=row['year'], month=row['month'], count=row['count']) for row in counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_relatedpost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyPostCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('year', 'month')},
+            },
+        ),
+        migrations.RunPython(fill_monthly_post_counts, migrations.RunPython.noop),
+    ]
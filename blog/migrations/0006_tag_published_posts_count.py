@@ -0,0 +1,26 @@
+# Generated by Django 2.2.28 on 2026-10-19 18:57
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_published_posts_count(apps, schema_editor):
+    Tag = apps.get_model('blog', 'Tag')
+    for tag in Tag.objects.filter(posts__draft=False).annotate(count=Count('posts')):
+        Tag.objects.filter(pk=tag.pk).update(published_posts_count=tag.count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_monthlypostcount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='published_posts_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_published_posts_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-19 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_tag_published_posts_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='popularity',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='views',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 2.2.28 on 2026-10-19 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_post_views_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField()),
+                ('url', models.CharField(max_length=200)),
+                ('visitor', models.CharField(max_length=32)),
+                ('status', models.IntegerField()),
+                ('duration', models.FloatField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourlyStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('url', models.CharField(blank=True, max_length=200)),
+                ('hits', models.IntegerField(default=0)),
+                ('duration', models.FloatField(default=0)),
+                ('visitors', models.IntegerField(default=0)),
+                ('sketch', models.BinaryField()),
+            ],
+            options={
+                'unique_together': {('hour', 'url')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('url', models.CharField(blank=True, max_length=200)),
+                ('hits', models.IntegerField(default=0)),
+                ('duration', models.FloatField(default=0)),
+                ('visitors', models.IntegerField(default=0)),
+                ('sketch', models.BinaryField()),
+            ],
+            options={
+                'unique_together': {('day', 'url')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.28 on 2026-10-19 19:03
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_analytics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Revision',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(max_length=4)),
+                ('object_pk', models.IntegerField()),
+                ('number', models.IntegerField()),
+                ('date', models.DateTimeField(default=datetime.datetime.utcnow)),
+                ('title', models.CharField(max_length=150)),
+                ('snapshot', models.BooleanField(default=False)),
+                ('data', models.BinaryField()),
+                ('author', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='blog.User')),
+            ],
+            options={
+                'unique_together': {('doc_type', 'object_pk', 'number')},
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 2.2.28 on 2026-10-19 19:05
+
+import code.blog.compressed
+from django.db import migrations, models
+
+
+def compress_bodies(apps, schema_editor):
+    for name in ['Post', 'Page']:
+        model = apps.get_model('blog', name)
+        for document in model.objects.only('pk', 'body').iterator():
+            model.objects.filter(pk=document.pk).update(body_z=document.body)
+
+
+def decompress_bodies(apps, schema_editor):
+    for name in ['Post', 'Page']:
+        model = apps.get_model('blog', name)
+        for document in model.objects.only('pk', 'body_z').iterator():
+            model.objects.filter(pk=document.pk).update(body=document.body_z)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='body_z',
+            field=code.blog.compressed.CompressedTextField(default=''),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='body_z',
+            field=code.blog.compressed.CompressedTextField(default=''),
+            preserve_default=False,
+        ),
+        migrations.RunPython(compress_bodies, decompress_bodies),
+        # Defaults, for the columns to be added back when migrating backwards
+        migrations.AlterField(
+            model_name='post',
+            name='body',
+            field=models.TextField(default=''),
+        ),
+        migrations.AlterField(
+            model_name='page',
+            name='body',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='post',
+            name='body',
+        ),
+        migrations.RemoveField(
+            model_name='page',
+            name='body',
+        ),
+        migrations.RenameField(
+            model_name='post',
+            old_name='body_z',
+            new_name='body',
+        ),
+        migrations.RenameField(
+            model_name='page',
+            old_name='body_z',
+            new_name='body',
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-19 19:06
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_compressed_bodies'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='date',
+            field=models.DateTimeField(default=datetime.datetime.utcnow),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.28 on 2026-10-19 19:08
+
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    from code.blog import links
+
+    Post = apps.get_model('blog', 'Post')
+    for post in Post.objects.only('pk', 'uid', 'date').iterator():
+        Post.objects.filter(pk=post.pk).update(path=links.post_path(post.date.year, post.date.month, post.uid))
+
+    Page = apps.get_model('blog', 'Page')
+    for page in Page.objects.only('pk', 'uid').iterator():
+        Page.objects.filter(pk=page.pk).update(path=links.page_path(page.uid))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_file_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-19 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_post_page_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='popularity_epoch',
+            field=models.IntegerField(default=0),
+        ),
+    ]
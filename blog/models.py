@@ -16,10 +16,12 @@
 #
 
 from django.db import models
-from django.urls import reverse
 from django.conf import settings as project_settings
 from datetime import datetime, timedelta
 from . import settings
+from .compressed import CompressedTextField
+from . import links
+import base64
 import os
 import re
 
@@ -31,6 +33,8 @@ class UserLevel():
 class Tag(models.Model):
     name = models.CharField(max_length=50)
     uid = models.CharField(max_length=50)
+    # Maintained by tag_counts
+    published_posts_count = models.IntegerField(default=0)
     
     def to_dict(self):
         return {
@@ -147,11 +151,15 @@ class Comment(models.Model):
 class File(models.Model):
     name = models.CharField(max_length=100)
     content = models.BinaryField()
+    size = models.IntegerField(default=0)
+    checksum = models.CharField(max_length=64, default="")
+    # Unlinked files younger than the grace period are kept, see file_gc.py
+    date = models.DateTimeField(default=datetime.utcnow)
 
 class Post(models.Model):
     uid = models.CharField(max_length=150)
     title = models.CharField(max_length=150)
-    body = models.TextField()
+    body = CompressedTextField()
     tags = models.ManyToManyField(Tag, related_name="posts")
     authors = models.ManyToManyField(User, related_name="posts")
     draft = models.BooleanField(default=True)
@@ -160,20 +168,46 @@ class Post(models.Model):
     edit_date = models.DateTimeField(default=datetime.utcnow)
     files = models.ManyToManyField(File, related_name="+")
     comments = models.ManyToManyField(Comment, related_name="+")
+    # Maintained by view_counts
+    views = models.IntegerField(default=0)
+    popularity = models.FloatField(default=0, db_index=True)
+    popularity_epoch = models.IntegerField(default=0)
+    # Canonical path, updated on save
+    path = models.CharField(max_length=200, default="", editable=False, db_index=True)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Keep the values read from the database to detect changes on save
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
+    def save(self, *args, **kwargs):
+        if not {"uid", "date"} & self.get_deferred_fields():
+            self.path = links.post_path(self.date.year, self.date.month, self.uid)
+        
+        super().save(*args, **kwargs)
+        # The saved values are the ones in the database now, for the next save
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {field.attname: getattr(self, field.attname)
+                               for field in self._meta.concrete_fields if field.attname not in deferred}
+    
+    def get_absolute_url(self):
+        return links.add_prefix(self.path)
+    
+    def related_posts(self):
+        return Post.objects.filter(related_from__post=self, draft=False).defer('body') \
+            .order_by('-related_from__score', '-pk')[:settings.RELATED_POSTS]
     
     def body_preview(self):
-        tmp = re.sub('src="(?!(http://)|(https://))',
-                     'src="{}{}'.format(project_settings.SECURE_SITE_URL, reverse('post', kwargs={
-                         "year": self.date.year,
-                         "month": self.date.strftime('%m'),
-                         "uid": self.uid})),
-                     self.body)
-        return re.sub('href="(?!(http://)|(https://))',
-                      'href="{}{}'.format(project_settings.SECURE_SITE_URL, reverse('post', kwargs={
-                          "year": self.date.year,
-                          "month": self.date.strftime('%m'),
-                          "uid": self.uid})),
-                      tmp)
+        from .fragments import get_or_render
+        
+        return get_or_render("body_preview", self, self.render_body_preview)
+    
+    def render_body_preview(self):
+        url = project_settings.SECURE_SITE_URL + self.get_absolute_url()
+        tmp = re.sub('src="(?!(http://)|(https://))', 'src="{}'.format(url), self.body)
+        return re.sub('href="(?!(http://)|(https://))', 'href="{}'.format(url), tmp)
     
     def to_dict(self):
         return {
@@ -220,9 +254,20 @@ class Post(models.Model):
 class Page(models.Model):
     uid = models.CharField(max_length=150)
     title = models.CharField(max_length=150)
-    body = models.TextField()
+    body = CompressedTextField()
     files = models.ManyToManyField(File, related_name="+")
     edit_date = models.DateTimeField(auto_now=True)
+    # Canonical path, updated on save
+    path = models.CharField(max_length=200, default="", editable=False, db_index=True)
+    
+    def save(self, *args, **kwargs):
+        if "uid" not in self.get_deferred_fields():
+            self.path = links.page_path(self.uid)
+        
+        super().save(*args, **kwargs)
+    
+    def get_absolute_url(self):
+        return links.add_prefix(self.path)
     
     def to_dict(self):
         return {
@@ -242,3 +287,98 @@ class Page(models.Model):
         self.edit_date = data['edit_date']
         
         self.save()
+
+class RelatedPost(models.Model):
+    post = models.ForeignKey(Post, models.CASCADE, related_name="related_entries")
+    related = models.ForeignKey(Post, models.CASCADE, related_name="related_from")
+    score = models.FloatField()
+    
+    class Meta:
+        unique_together = [("post", "related")]
+        indexes = [models.Index(fields=["post", "-score"])]
+
+class MonthlyPostCount(models.Model):
+    year = models.IntegerField()
+    month = models.IntegerField()
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = [("year", "month")]
+
+class InvalidationEvent(models.Model):
+    model = models.CharField(max_length=50)
+    object_pk = models.IntegerField()
+    origin = models.CharField(max_length=32)
+    version = models.BigIntegerField()
+    date = models.DateTimeField(default=datetime.utcnow, db_index=True)
+
+class Hit(models.Model):
+    date = models.DateTimeField()
+    url = models.CharField(max_length=200)
+    # Hash of address, user agent and day, see analytics.visitor_id
+    visitor = models.CharField(max_length=32)
+    status = models.IntegerField()
+    duration = models.FloatField()
+
+class HourlyStat(models.Model):
+    hour = models.DateTimeField()
+    # Empty for the whole site
+    url = models.CharField(max_length=200, blank=True)
+    hits = models.IntegerField(default=0)
+    duration = models.FloatField(default=0)
+    visitors = models.IntegerField(default=0)
+    sketch = models.BinaryField()
+    
+    class Meta:
+        unique_together = [("hour", "url")]
+
+class DailyStat(models.Model):
+    day = models.DateField()
+    url = models.CharField(max_length=200, blank=True)
+    hits = models.IntegerField(default=0)
+    duration = models.FloatField(default=0)
+    visitors = models.IntegerField(default=0)
+    sketch = models.BinaryField()
+    
+    class Meta:
+        unique_together = [("day", "url")]
+
+class Revision(models.Model):
+    # "post" or "page"
+    doc_type = models.CharField(max_length=4)
+    object_pk = models.IntegerField()
+    number = models.IntegerField()
+    date = models.DateTimeField(default=datetime.utcnow)
+    author = models.ForeignKey(User, models.SET_NULL, null=True, related_name="+")
+    title = models.CharField(max_length=150)
+    # zlib compressed: the body if snapshot, otherwise the delta from the
+    # previous revision (see revisions.py)
+    snapshot = models.BooleanField(default=False)
+    data = models.BinaryField()
+    
+    class Meta:
+        unique_together = [("doc_type", "object_pk", "number")]
+    
+    def to_dict(self):
+        return {
+            "doc_type": self.doc_type,
+            "object_pk": self.object_pk,
+            "number": self.number,
+            "date": self.date,
+            "author": self.author_id,
+            "title": self.title,
+            "snapshot": self.snapshot,
+            "data": base64.b64encode(bytes(self.data)).decode("ascii"),
+        }
+    
+    def from_dict(self, data):
+        self.doc_type = data['doc_type']
+        self.object_pk = data['object_pk']
+        self.number = data['number']
+        self.date = data['date']
+        self.author_id = data['author']
+        self.title = data['title']
+        self.snapshot = data['snapshot']
+        self.data = base64.b64decode(data['data'])
+        
+        self.save()
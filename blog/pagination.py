@@ -0,0 +1,132 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Keyset pagination: a page starts after (or ends before) the sort key of
+# a row instead of skipping an offset, so that every page costs the same
+# indexed query however deep it is.
+
+from django.core.exceptions import SuspiciousOperation, ValidationError
+from django.db import connections
+from django.db.models import Q
+import base64
+import json
+
+# Any integer outside this range overflows the database drivers
+BIGINT_RANGE = (-9223372036854775808, 9223372036854775807)
+
+class InvalidCursor(SuspiciousOperation):
+    # Turned into a 400 response by Django
+    pass
+
+def encode_cursor(values):
+    # Dates keep their microseconds, DjangoJSONEncoder would round them
+    # and break the equality on the sort key
+    content = json.dumps(values, default=lambda value: value.isoformat())
+    return base64.urlsafe_b64encode(content.encode("utf-8")).decode("ascii")
+
+def ordering_fields(queryset, ordering):
+    # The model fields, or the output fields of the annotations, the
+    # ordering sorts by
+    fields = []
+    for name in ordering:
+        name = name.lstrip("-")
+        if name in queryset.query.annotations:
+            fields.append(queryset.query.annotations[name].output_field)
+        elif name == "pk":
+            fields.append(queryset.model._meta.pk)
+        else:
+            fields.append(queryset.model._meta.get_field(name))
+    return fields
+
+def clean(field, value, using):
+    # Cursors come from the query string, so every value is checked to be
+    # one the database can compare with the column
+    if value is None:
+        raise InvalidCursor("Invalid cursor value")
+
+    try:
+        value = field.to_python(value)
+    except (ValidationError, TypeError, ValueError):
+        raise InvalidCursor("Invalid cursor value")
+
+    if isinstance(value, int):
+        low, high = connections[using].ops.integer_field_ranges.get(field.get_internal_type(), BIGINT_RANGE)
+        if not low <= value <= high:
+            raise InvalidCursor("Invalid cursor value")
+    return value
+
+def decode_cursor(cursor, fields, using):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    except (ValueError, UnicodeError):
+        raise InvalidCursor("Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise InvalidCursor("Invalid cursor")
+    return [clean(field, value, using) for field, value in zip(fields, values)]
+
+def after(ordering, values, reverse=False):
+    # Rows following the given key in ordering, a list of field names with
+    # an optional "-" prefix: (a > x) or (a = x and b > y) or ...
+    condition = Q()
+    equal = Q()
+
+    for field, value in zip(ordering, values):
+        descending = field.startswith("-") != reverse
+        name = field.lstrip("-")
+
+        condition |= equal & Q(**{"{}__{}".format(name, "lt" if descending else "gt"): value})
+        equal &= Q(**{name: value})
+
+    return condition
+
+def key(row, ordering):
+    return [getattr(row, field.lstrip("-")) for field in ordering]
+
+def paginate(queryset, ordering, size, after_cursor=None, before_cursor=None):
+    # The last field of ordering must be unique (usually pk). Returns the
+    # rows and the cursors of the next and previous pages, None on the
+    # first and last page. Raises InvalidCursor when a cursor wasn't made
+    # by encode_cursor for this ordering.
+    fields = ordering_fields(queryset, ordering)
+    cursor = decode_cursor(before_cursor, fields, queryset.db) if before_cursor else None
+    backwards = cursor is not None
+
+    if not backwards and after_cursor:
+        cursor = decode_cursor(after_cursor, fields, queryset.db)
+
+    if backwards:
+        reversed_ordering = [field[1:] if field.startswith("-") else "-" + field for field in ordering]
+        rows = list(queryset.filter(after(ordering, cursor, reverse=True)).order_by(*reversed_ordering)[:size + 1])
+        more = len(rows) > size
+        rows = rows[:size][::-1]
+    else:
+        if cursor is not None:
+            queryset = queryset.filter(after(ordering, cursor))
+        rows = list(queryset.order_by(*ordering)[:size + 1])
+        more = len(rows) > size
+        rows = rows[:size]
+
+    if not rows:
+        return rows, None, None
+
+    has_next = more if not backwards else True
+    has_previous = more if backwards else cursor is not None
+
+    return (rows,
+            encode_cursor(key(rows[-1], ordering)) if has_next else None,
+            encode_cursor(key(rows[0], ordering)) if has_previous else None)
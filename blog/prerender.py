@@ -0,0 +1,141 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+from django.conf import settings as project_settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.urls import reverse, resolve
+from django.http import Http404
+from urllib.parse import urlsplit
+import asyncio
+import io
+
+from . import models
+from . import settings
+
+def make_request(path):
+    # The request a visitor of the secure site would send
+    url = urlsplit(project_settings.SECURE_SITE_URL)
+    return WSGIRequest({
+        "REQUEST_METHOD": "GET",
+        "SCRIPT_NAME": "",
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "HTTP_HOST": url.netloc,
+        "SERVER_NAME": url.hostname,
+        "SERVER_PORT": str(url.port or 443),
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "wsgi.url_scheme": "https",
+        "wsgi.input": io.BytesIO(),
+    })
+
+def render_path(path):
+    # Renders a public page as an anonymous visitor, without middlewares.
+    # Attachments are exported without the trailing slash that
+    # APPEND_SLASH would add, as they are linked from the post bodies.
+    match = resolve(path if path.endswith("/") else path + "/")
+    request = make_request(path)
+    request.resolver_match = match
+
+    view = match.func
+    if asyncio.iscoroutinefunction(view):
+        # Async views under ASGI, called from a thread without event loop
+        from asgiref.sync import async_to_sync
+        view = async_to_sync(view)
+
+    try:
+        response = view(request, *match.args, **match.kwargs)
+    except Http404:
+        return None
+
+    if hasattr(response, "render"):
+        response = response.render()
+
+    if response.status_code != 200:
+        return None
+
+    return response
+
+def page_count(posts_count):
+    return max(1, (posts_count + settings.POSTS_PER_PAGE - 1) // settings.POSTS_PER_PAGE)
+
+def listing_paths(name, posts_count, **kwargs):
+    paths = [reverse(name, kwargs=kwargs)]
+    for page_number in range(1, page_count(posts_count)):
+        paths.append(reverse(name, kwargs=dict(kwargs, page_number=page_number)))
+    return paths
+
+def post_url(post):
+    return post.get_absolute_url()
+
+def post_paths(post):
+    path = post_url(post)
+    return [path] + [path + f.name for f in post.files.all().only('name')]
+
+def page_paths(page):
+    path = page.get_absolute_url()
+    return [path] + [path + f.name for f in page.files.all().only('name')]
+
+def index_paths():
+    return listing_paths('index', models.Post.objects.filter(draft__exact=False).count()) + \
+        [reverse('feed')]
+
+def tag_paths(tag):
+    return listing_paths('tag', tag.published_posts_count, tag_uid=tag.uid) + \
+        [reverse('tag_feed', kwargs={"tag_uid": tag.uid})]
+
+def author_paths(author):
+    return listing_paths('author', author.posts.filter(draft__exact=False).count(), username=author.username) + \
+        [reverse('author_feed', kwargs={"username": author.username})]
+
+def archive_paths(post):
+    return [reverse('archive'),
+            reverse('archive_year', kwargs={"year": post.date.year}),
+            reverse('archive_month', kwargs={"year": post.date.year, "month": post.date.strftime('%m')})]
+
+def affected_paths(post):
+    # Every public page showing the post
+    paths = post_paths(post) + index_paths() + archive_paths(post) + [reverse('tags')]
+    for tag in post.tags.all():
+        paths += tag_paths(tag)
+    for author in post.authors.all():
+        paths += author_paths(author)
+    return paths
+
+def all_paths():
+    paths = index_paths()
+
+    for post in models.Post.objects.filter(draft__exact=False).only('path'):
+        paths += post_paths(post)
+
+    if models.MonthlyPostCount.objects.filter(count__gt=0).exists():
+        paths.append(reverse('archive'))
+    for month in models.MonthlyPostCount.objects.filter(count__gt=0).order_by('year', 'month'):
+        paths.append(reverse('archive_month', kwargs={"year": month.year, "month": "{:02d}".format(month.month)}))
+    for year in models.MonthlyPostCount.objects.filter(count__gt=0).values_list('year', flat=True).distinct():
+        paths.append(reverse('archive_year', kwargs={"year": year}))
+
+    for page in models.Page.objects.only('path'):
+        paths += page_paths(page)
+
+    paths.append(reverse('tags'))
+    for tag in models.Tag.objects.filter(published_posts_count__gt=0):
+        paths += tag_paths(tag)
+
+    for author in models.User.objects.filter(posts__draft=False).distinct():
+        paths += author_paths(author)
+
+    return paths
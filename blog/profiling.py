@@ -0,0 +1,220 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+from datetime import datetime, timedelta
+import collections
+import asyncio
+import threading
+import cProfile
+import pstats
+import random
+import json
+import time
+import sys
+import io
+import os
+import re
+
+from . import async_support
+from . import settings
+
+# Files written for each profile, the .json file holds the metadata
+KINDS = ["json", "prof", "folded"]
+
+NAME_RE = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$")
+
+class StackSampler(threading.Thread):
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+
+            stack = []
+            while frame is not None:
+                stack.append("{} ({}:{})".format(
+                    frame.f_code.co_name,
+                    os.path.basename(frame.f_code.co_filename),
+                    frame.f_code.co_firstlineno))
+                frame = frame.f_back
+
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def folded(self):
+        return "".join("{} {}\n".format(stack, count) for stack, count in self.stacks.items())
+
+def profile_path(name, kind):
+    return os.path.join(settings.PROFILE_DIR, "{}.{}".format(name, kind))
+
+def save(request, profiler, sampler, duration):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+
+    date = datetime.utcnow()
+    name = "{}-{}".format(date.strftime("%Y%m%d-%H%M%S"), os.urandom(4).hex())
+
+    profiler.dump_stats(profile_path(name, "prof"))
+
+    with open(profile_path(name, "folded"), "w") as f:
+        f.write(sampler.folded())
+
+    match = request.resolver_match
+    with open(profile_path(name, "json"), "w") as f:
+        json.dump({
+            "name": name,
+            "date": date.isoformat(),
+            "path": request.get_full_path(),
+            "view": match.view_name if match else None,
+            "duration": duration,
+            "samples": sum(sampler.stacks.values()),
+        }, f)
+
+    apply_retention()
+
+def delete(name):
+    for kind in KINDS:
+        try:
+            os.remove(profile_path(name, kind))
+        except FileNotFoundError:
+            pass
+
+def apply_retention():
+    oldest = (datetime.utcnow() - timedelta(days=settings.PROFILE_MAX_AGE_DAYS)).strftime("%Y%m%d-%H%M%S")
+    names = sorted(profile["name"] for profile in list_profiles())
+
+    for n, name in enumerate(names):
+        if name < oldest or n < len(names) - settings.PROFILE_MAX_FILES:
+            delete(name)
+
+def list_profiles():
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+
+    profiles = []
+    for filename in os.listdir(settings.PROFILE_DIR):
+        if filename.endswith(".json"):
+            try:
+                with open(os.path.join(settings.PROFILE_DIR, filename), "r") as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                pass
+
+    return sorted(profiles, key=lambda profile: profile["name"], reverse=True)
+
+def read_profile(name, kind):
+    if not NAME_RE.match(name) or kind not in KINDS + ["txt"]:
+        return None
+
+    if kind == "txt":
+        path = profile_path(name, "prof")
+        if not os.path.exists(path):
+            return None
+        stream = io.StringIO()
+        pstats.Stats(path, stream=stream).sort_stats("cumulative").print_stats(50)
+        return stream.getvalue().encode("utf-8")
+
+    try:
+        with open(profile_path(name, kind), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+class Profile():
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL)
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.sampler.start()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        self.sampler.stop()
+        self.duration = time.perf_counter() - self.start_time
+
+    def save(self, request):
+        save(request, self.profiler, self.sampler, self.duration)
+
+def is_admin(request):
+    # Imported here to keep views out of the middleware loading
+    from .views import get_logged_user
+
+    logged_user = get_logged_user(request)
+    return logged_user is not None and logged_user.LEVEL_FULL()
+
+def is_requested(request):
+    return "profile" in request.GET or "HTTP_X_PROFILE" in request.META
+
+def is_sampled():
+    return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+class ProfilingMiddleware():
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+
+        if self.is_async:
+            async_support.mark_coroutine(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        if not (is_requested(request) and is_admin(request)) and not is_sampled():
+            return self.get_response(request)
+
+        profile = Profile()
+        profile.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.stop()
+            profile.save(request)
+
+        return response
+
+    async def __acall__(self, request):
+        from asgiref.sync import sync_to_async
+
+        if not (is_requested(request) and await sync_to_async(is_admin)(request)) and not is_sampled():
+            return await self.get_response(request)
+
+        # Under ASGI the event loop thread is profiled, which includes any
+        # other request served concurrently
+        profile = Profile()
+        profile.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile.stop()
+            await sync_to_async(profile.save)(request)
+
+        return response
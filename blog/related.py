@@ -0,0 +1,219 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Related posts, precomputed in the RelatedPost table. Two posts are
+# related by the tags they share, rare tags weighting more than common
+# ones, and optionally by the words their titles share.
+#
+# Posts whose tags or draft state change are refreshed when the change is
+# committed, once per post whatever the number of tags added or removed;
+# rebuild() (manage.py rebuild_related) recomputes everything.
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import post_save, m2m_changed
+from django.dispatch import receiver
+import collections
+import threading
+import math
+import re
+
+from . import models
+from . import settings
+from . import fragments
+
+PostTag = models.Post.tags.through
+
+# Posts to refresh, per thread like the connections and their
+# transactions
+local = threading.local()
+
+def pending():
+    if not hasattr(local, "pending"):
+        local.pending = set()
+    return local.pending
+
+def idf(posts_with_tag, posts_count):
+    return math.log(1 + posts_count / max(1, posts_with_tag))
+
+def title_words(title):
+    return {word for word in re.findall(r"\w+", title.lower()) if len(word) > 3}
+
+def score(shared_weight, tags_count, other_tags_count, words, other_words):
+    value = shared_weight / math.sqrt(tags_count * other_tags_count)
+
+    if settings.RELATED_TEXT_WEIGHT > 0 and words and other_words:
+        value += settings.RELATED_TEXT_WEIGHT * len(words & other_words) / len(words | other_words)
+
+    return value
+
+def top(scores):
+    return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))[:settings.RELATED_POSTS]
+
+def compute(post):
+    # Scores of the published posts sharing a tag with post
+    tags = list(PostTag.objects.filter(post_id=post.pk).values_list('tag_id', flat=True))
+    if not tags:
+        return {}
+
+    published = PostTag.objects.filter(post__draft=False)
+    posts_count = models.Post.objects.filter(draft=False).count()
+    weights = {row['tag_id']: idf(row['count'], posts_count) for row in
+               published.filter(tag_id__in=tags).values('tag_id').annotate(count=Count('post_id'))}
+
+    shared = collections.defaultdict(float)
+    for other_pk, tag_pk in published.filter(tag_id__in=tags).exclude(post_id=post.pk).values_list('post_id', 'tag_id'):
+        shared[other_pk] += weights.get(tag_pk, 0)
+
+    if not shared:
+        return {}
+
+    tags_counts = dict(PostTag.objects.filter(post_id__in=shared).values('post_id')
+                       .annotate(count=Count('tag_id')).values_list('post_id', 'count'))
+    titles = dict(models.Post.objects.filter(pk__in=shared).values_list('pk', 'title')) \
+        if settings.RELATED_TEXT_WEIGHT > 0 else {}
+
+    words = title_words(post.title)
+    return {other_pk: score(weight, len(tags), tags_counts[other_pk], words, title_words(titles.get(other_pk, "")))
+            for other_pk, weight in shared.items()}
+
+def refresh(post_pk):
+    post = models.Post.objects.filter(pk=post_pk).only('pk', 'title', 'draft').first()
+    if post is None:
+        return
+
+    scores = compute(post)
+
+    with transaction.atomic():
+        models.RelatedPost.objects.filter(post_id=post_pk).delete()
+        models.RelatedPost.objects.bulk_create(
+            models.RelatedPost(post_id=post_pk, related_id=other_pk, score=value) for other_pk, value in top(scores))
+
+        # Lists of the other posts: drop the post where it doesn't belong
+        # any more, and place it by its new score where it does
+        listing = list(models.RelatedPost.objects.filter(related_id=post_pk).values_list('post_id', flat=True))
+        if post.draft:
+            scores = {}
+
+        models.RelatedPost.objects.filter(related_id=post_pk).exclude(post_id__in=scores).delete()
+
+        lists = collections.defaultdict(dict)
+        for row in models.RelatedPost.objects.filter(post_id__in=scores).exclude(related_id=post_pk):
+            lists[row.post_id][row.related_id] = row.score
+
+        for other_pk, value in scores.items():
+            entries = lists[other_pk]
+            entries[post_pk] = value
+            kept = dict(top(entries))
+
+            models.RelatedPost.objects.filter(post_id=other_pk, related_id__in=set(entries) - set(kept)).delete()
+            if post_pk in kept:
+                models.RelatedPost.objects.update_or_create(
+                    post_id=other_pk, related_id=post_pk, defaults={"score": value})
+
+    # Lists that lost the post are refilled from scratch
+    for other_pk in set(listing) - set(scores):
+        refresh_list(other_pk)
+
+def refresh_list(post_pk):
+    post = models.Post.objects.filter(pk=post_pk).only('pk', 'title').first()
+    if post is None:
+        return
+
+    with transaction.atomic():
+        models.RelatedPost.objects.filter(post_id=post_pk).delete()
+        models.RelatedPost.objects.bulk_create(
+            models.RelatedPost(post_id=post_pk, related_id=other_pk, score=value) for other_pk, value in top(compute(post)))
+
+def rebuild():
+    # Everything in memory: a row per post and tag is small even for large
+    # blogs, and it saves a query per post
+    pending().clear()
+
+    published = set(models.Post.objects.filter(draft=False).values_list('pk', flat=True))
+    titles = dict(models.Post.objects.values_list('pk', 'title')) if settings.RELATED_TEXT_WEIGHT > 0 else {}
+
+    post_tags = collections.defaultdict(set)
+    tag_posts = collections.defaultdict(set)
+    for post_pk, tag_pk in PostTag.objects.values_list('post_id', 'tag_id'):
+        post_tags[post_pk].add(tag_pk)
+        if post_pk in published:
+            tag_posts[tag_pk].add(post_pk)
+
+    weights = {tag_pk: idf(len(posts), len(published)) for tag_pk, posts in tag_posts.items()}
+
+    rows = []
+    for post_pk, tags in post_tags.items():
+        shared = collections.defaultdict(float)
+        for tag_pk in tags:
+            for other_pk in tag_posts[tag_pk]:
+                if other_pk != post_pk:
+                    shared[other_pk] += weights[tag_pk]
+
+        words = title_words(titles.get(post_pk, ""))
+        scores = {other_pk: score(weight, len(tags), len(post_tags[other_pk]), words,
+                                  title_words(titles.get(other_pk, "")))
+                  for other_pk, weight in shared.items()}
+
+        rows += [models.RelatedPost(post_id=post_pk, related_id=other_pk, score=value)
+                 for other_pk, value in top(scores)]
+
+    with transaction.atomic():
+        models.RelatedPost.objects.all().delete()
+        models.RelatedPost.objects.bulk_create(rows, batch_size=500)
+
+    return len(rows)
+
+def schedule(pks):
+    # The first callback to run refreshes every post scheduled so far. In a
+    # transaction that is rolled back the posts stay pending until the next
+    # commit, refreshing them again is harmless.
+    pending().update(pks)
+    transaction.on_commit(flush)
+
+def flush():
+    pks = list(pending())
+    pending().clear()
+
+    for pk in pks:
+        refresh(pk)
+
+    # Other posts' related lists may have changed too
+    if pks:
+        fragments.site_changed()
+
+@receiver(m2m_changed, sender=PostTag)
+def post_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ["post_add", "post_remove", "pre_clear"]:
+        return
+
+    if not reverse:
+        schedule([instance.pk])
+    elif action == "pre_clear":
+        schedule(instance.posts.values_list('pk', flat=True))
+    else:
+        schedule(pk_set)
+
+@receiver(post_save, sender=models.Post)
+def post_saved(sender, instance, created, **kwargs):
+    loaded = getattr(instance, "_loaded_values", {})
+    if created:
+        return
+
+    if loaded.get("draft", instance.draft) != instance.draft or \
+            (settings.RELATED_TEXT_WEIGHT > 0 and loaded.get("title", instance.title) != instance.title):
+        schedule([instance.pk])
@@ -0,0 +1,295 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Whole page cache for anonymous visitors. Pages affected by a change are
+# marked stale and rendered again by a background thread, meanwhile (and
+# whenever the database fails) visitors get the last good render.
+
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, transaction, close_old_connections
+from django.db.models.signals import post_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+import collections
+import threading
+import hashlib
+import logging
+import time
+import os
+
+from . import models
+from . import settings
+from . import prerender
+from . import invalidation
+from . import links
+from .conditional import viewer
+
+# Public views rendered the same way for every anonymous visitor
+CACHED_VIEWS = [
+    "index",
+    "author",
+    "tag",
+    "tags",
+    "post",
+    "feed",
+    "tag_feed",
+    "author_feed",
+    "page",
+    "archive",
+    "archive_year",
+    "archive_month",
+]
+
+logger = logging.getLogger("code.blog.render_cache")
+
+# Pending work for the background thread, in order and without duplicates:
+# ("path", path) renders a page again, the other kinds find the pages
+# showing the given object
+pending = collections.OrderedDict()
+pending_condition = threading.Condition()
+
+worker_pid = None
+
+def cache_key(path):
+    return "render:" + hashlib.md5(path.encode("utf-8")).hexdigest()
+
+def store(path, response):
+    content = response.content
+
+    if not response.has_header("ETag"):
+        response["ETag"] = quote_etag(hashlib.md5(content).hexdigest())
+
+    cache.set(cache_key(path), {
+        "content": content,
+        "content_type": response["Content-Type"],
+        "etag": response["ETag"],
+        "last_modified": parse_http_date_safe(response.get("Last-Modified", "")),
+        "date": time.time(),
+        "stale": False,
+    }, settings.RENDER_CACHE_TIMEOUT)
+
+def serve(request, entry, state):
+    response = get_conditional_response(request, etag=entry["etag"], last_modified=entry["last_modified"])
+    if response is None:
+        response = HttpResponse(entry["content"], content_type=entry["content_type"])
+
+    response["ETag"] = entry["etag"]
+    if entry["last_modified"]:
+        response["Last-Modified"] = http_date(entry["last_modified"])
+    response["X-Render-Cache"] = state
+    patch_vary_headers(response, ("Cookie",))
+    return response
+
+def is_stale(entry):
+    return entry["stale"] or time.time() - entry["date"] > settings.RENDER_CACHE_MAX_AGE
+
+def mark_stale(paths):
+    # Pages nobody asked for since they expired are left to the next visitor
+    cached = []
+    for path in paths:
+        key = cache_key(path)
+        entry = cache.get(key)
+        if entry is not None:
+            cached.append(path)
+            if not entry["stale"]:
+                entry["stale"] = True
+                cache.set(key, entry, settings.RENDER_CACHE_TIMEOUT)
+
+    schedule(("path", path) for path in cached)
+
+def regenerate(path):
+    if cache.get(cache_key(path)) is None:
+        return
+
+    response = prerender.render_path(path)
+    if response is None:
+        cache.delete(cache_key(path))
+    else:
+        store(path, response)
+
+def paths_for(kind, pk):
+    if kind == "post":
+        post = models.Post.objects.filter(pk=pk).first()
+        return prerender.affected_paths(post) if post else prerender.index_paths()
+    if kind == "comments":
+        post = models.Post.objects.filter(pk=pk).only('path').first()
+        return [prerender.post_url(post)] if post else []
+    if kind == "tag":
+        tag = models.Tag.objects.filter(pk=pk).first()
+        return prerender.tag_paths(tag) if tag else []
+    if kind == "page":
+        page = models.Page.objects.filter(pk=pk).first()
+        return prerender.page_paths(page) if page else []
+    return []
+
+def run_worker():
+    while True:
+        with pending_condition:
+            while not pending:
+                pending_condition.wait()
+            (kind, value), _ = pending.popitem(last=False)
+
+        try:
+            if kind == "path":
+                regenerate(value)
+            else:
+                mark_stale(paths_for(kind, value))
+        except Exception:
+            # The stale render stays in place until a later attempt
+            logger.exception("Render of %s %s failed", kind, value)
+        finally:
+            close_old_connections()
+
+def schedule(tasks):
+    global worker_pid
+
+    if not settings.RENDER_CACHE:
+        return
+
+    with pending_condition:
+        for task in tasks:
+            pending[task] = None
+
+        if worker_pid != os.getpid():
+            threading.Thread(target=run_worker, name="render-cache-worker", daemon=True).start()
+            worker_pid = os.getpid()
+
+        pending_condition.notify()
+
+def schedule_on_commit(tasks):
+    tasks = list(tasks)
+    transaction.on_commit(lambda: schedule(tasks))
+
+def is_cacheable(request):
+    return request.method in ["GET", "HEAD"] and not request.GET and not viewer(request)
+
+class RenderCacheMiddleware(MiddlewareMixin):
+    def __init__(self, get_response=None):
+        if not settings.RENDER_CACHE:
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.resolver_match.url_name not in CACHED_VIEWS or not is_cacheable(request):
+            return None
+
+        request.render_cache_path = request.path_info
+
+        entry = cache.get(cache_key(request.path_info))
+        if entry is None:
+            return None
+
+        if is_stale(entry):
+            schedule([("path", request.path_info)])
+            return serve(request, entry, "stale")
+
+        return serve(request, entry, "hit")
+
+    def process_exception(self, request, exception):
+        path = getattr(request, "render_cache_path", None)
+        if path is None or not isinstance(exception, DatabaseError):
+            return None
+
+        entry = cache.get(cache_key(path))
+        if entry is None:
+            return None
+
+        logger.warning("Serving a stale render of %s: %s", path, exception)
+        return serve(request, entry, "stale")
+
+    def process_response(self, request, response):
+        path = getattr(request, "render_cache_path", None)
+
+        # Pages using the CSRF token get a cookie bound to the visitor
+        if path is not None and response.status_code == 200 and not response.streaming and \
+                not response.has_header("X-Render-Cache") and not request.META.get("CSRF_COOKIE_USED"):
+            store(path, response)
+            response["X-Render-Cache"] = "miss"
+
+        return response
+
+@receiver(post_save, sender=models.Post)
+def post_saved(sender, instance, created, **kwargs):
+    loaded = {} if created else getattr(instance, "_loaded_values", {})
+
+    # Drafts show on no public page
+    if instance.draft and loaded.get("draft", created):
+        return
+
+    tasks = [("post", instance.pk)]
+
+    # The old address of a post whose date or uid changed now gives 404
+    if loaded.get("path") and loaded["path"] != instance.path:
+        tasks.append(("path", links.add_prefix(loaded["path"])))
+
+    schedule_on_commit(tasks)
+
+@receiver(pre_delete, sender=models.Post)
+def post_deleted(sender, instance, **kwargs):
+    if settings.RENDER_CACHE:
+        paths = prerender.affected_paths(instance)
+        transaction.on_commit(lambda: mark_stale(paths))
+
+@receiver(post_save, sender=models.Page)
+def page_saved(sender, instance, **kwargs):
+    schedule_on_commit([("page", instance.pk)])
+
+@receiver(pre_delete, sender=models.Page)
+def page_deleted(sender, instance, **kwargs):
+    if settings.RENDER_CACHE:
+        paths = prerender.page_paths(instance)
+        transaction.on_commit(lambda: mark_stale(paths))
+
+@receiver(m2m_changed, sender=models.Post.tags.through)
+def post_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not settings.RENDER_CACHE or reverse or instance.draft:
+        return
+
+    # Tag listings the post leaves must be rendered again too
+    if action == "pre_clear":
+        schedule_on_commit(("tag", pk) for pk in instance.tags.values_list("pk", flat=True))
+    elif action in ["post_add", "post_remove"]:
+        schedule_on_commit([("post", instance.pk)] + [("tag", pk) for pk in pk_set])
+
+@receiver(m2m_changed, sender=models.Post.comments.through)
+def post_comments_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if settings.RENDER_CACHE and action in ["post_add", "post_remove"]:
+        pks = pk_set if reverse else [instance.pk]
+        schedule_on_commit(("comments", pk) for pk in pks)
+
+def comment_changed(pk):
+    if not settings.RENDER_CACHE:
+        return
+
+    schedule(("comments", post_pk) for post_pk in
+             models.Post.objects.filter(comments__pk=pk).values_list("pk", flat=True))
+
+@receiver(post_save, sender=models.Comment)
+def comment_saved(sender, instance, **kwargs):
+    if settings.RENDER_CACHE:
+        transaction.on_commit(lambda: comment_changed(instance.pk))
+
+# Changes made by other processes, for caches local to each process
+# (schedule does nothing while the cache is off)
+invalidation.subscribe("post", lambda pk: schedule([("post", pk)]))
+invalidation.subscribe("page", lambda pk: schedule([("page", pk)]))
+invalidation.subscribe("tag", lambda pk: schedule([("tag", pk)]))
+invalidation.subscribe("comment", comment_changed)
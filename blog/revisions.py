@@ -0,0 +1,125 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Revision history of posts and pages. Every few revisions the body is
+# stored whole (a snapshot), the revisions in between store only a line
+# delta from the previous one: a JSON list whose entries are either
+# [start, end], to copy lines of the previous body, or a string to insert.
+# Both are zlib compressed. A revision is rebuilt from the snapshot before
+# it, with one query and at most REVISION_SNAPSHOT_INTERVAL - 1 patches.
+
+from django.db.models import Subquery
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from datetime import datetime
+import difflib
+import json
+import zlib
+
+from . import models
+from . import settings
+
+def delta(old, new):
+    old_lines = old.splitlines(True)
+    new_lines = new.splitlines(True)
+
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(new_lines[j1:j2]))
+    return ops
+
+def patch(old, ops):
+    old_lines = old.splitlines(True)
+    return "".join("".join(old_lines[op[0]:op[1]]) if isinstance(op, list) else op for op in ops)
+
+def compress(text):
+    return zlib.compress(text.encode("utf-8"), 9)
+
+def decompress(data):
+    return zlib.decompress(bytes(data)).decode("utf-8")
+
+def revisions(doc_type, object_pk):
+    return models.Revision.objects.filter(doc_type=doc_type, object_pk=object_pk)
+
+def chain(doc_type, object_pk, number):
+    # The revisions needed to rebuild number, oldest first
+    snapshot = revisions(doc_type, object_pk).filter(snapshot=True, number__lte=number) \
+        .order_by('-number').values('number')[:1]
+    return list(revisions(doc_type, object_pk).filter(number__lte=number, number__gte=Subquery(snapshot))
+                .order_by('number'))
+
+def rebuild(chain):
+    body = decompress(chain[0].data)
+    for revision in chain[1:]:
+        body = patch(body, json.loads(decompress(revision.data)))
+    return body
+
+def body(doc_type, object_pk, number):
+    revisions_chain = chain(doc_type, object_pk, number)
+    if not revisions_chain or revisions_chain[-1].number != number:
+        return None
+    return rebuild(revisions_chain)
+
+def record(doc_type, document, author=None, date=None):
+    last = revisions(doc_type, document.pk).order_by('-number').first()
+
+    if last is None:
+        return models.Revision.objects.create(
+            doc_type=doc_type, object_pk=document.pk, number=1, date=date or datetime.utcnow(),
+            author=author, title=document.title, snapshot=True, data=compress(document.body))
+
+    last_chain = chain(doc_type, document.pk, last.number)
+    previous = rebuild(last_chain)
+    if previous == document.body and last.title == document.title:
+        return last
+
+    full = compress(document.body)
+    data = compress(json.dumps(delta(previous, document.body), separators=(",", ":")))
+
+    # A snapshot also when the delta isn't smaller than the whole body
+    snapshot = len(last_chain) >= settings.REVISION_SNAPSHOT_INTERVAL or len(data) >= len(full)
+
+    return models.Revision.objects.create(
+        doc_type=doc_type, object_pk=document.pk, number=last.number + 1, date=date or datetime.utcnow(),
+        author=author, title=document.title, snapshot=snapshot, data=full if snapshot else data)
+
+def ensure_base(doc_type, document):
+    # Documents written before revisions existed, or restored from an old
+    # backup, start their history with the current version
+    if not revisions(doc_type, document.pk).exists():
+        record(doc_type, document, date=document.edit_date)
+
+def unified_diff(old, new):
+    # [(css class, line)]
+    lines = []
+    for line in difflib.unified_diff(old.splitlines(), new.splitlines(), lineterm="", n=3):
+        if line.startswith("+++") or line.startswith("---"):
+            continue
+        kind = {"+": "added", "-": "removed", "@": "hunk"}.get(line[:1], "")
+        lines.append((kind, line))
+    return lines
+
+@receiver(post_delete, sender=models.Post)
+def post_deleted(sender, instance, **kwargs):
+    revisions("post", instance.pk).delete()
+
+@receiver(post_delete, sender=models.Page)
+def page_deleted(sender, instance, **kwargs):
+    revisions("page", instance.pk).delete()
@@ -0,0 +1,134 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+from django.conf import settings as project_settings
+from django.core.exceptions import MiddlewareNotUsed
+import contextvars
+import asyncio
+import random
+
+from . import async_support
+from . import settings
+
+PRIMARY = "default"
+
+# Public views that can read from a replica
+READ_VIEWS = [
+    "index",
+    "author",
+    "tag",
+    "tags",
+    "post",
+    "post_file",
+    "feed",
+    "tag_feed",
+    "author_feed",
+    "archive",
+    "archive_year",
+    "archive_month",
+    "sitemap",
+    "sitemap_year",
+    "sitemap_pages",
+    "page",
+    "page_file",
+    "api_posts",
+    "api_post",
+    "api_pages",
+    "api_page",
+    "api_tags",
+    "api_authors",
+]
+
+# Views that write on GET requests
+WRITE_VIEWS = [
+    "toggle_delete_comment",
+    "oauth2callback",
+    "logout",
+]
+
+# Models always read from the primary: users are read and written back
+# (session rotation) by every request of a logged user
+PRIMARY_MODELS = ["user"]
+
+# Cookie keeping the reads of a client on the primary after a write
+STICKY_COOKIE = "use_primary_db"
+
+replica = contextvars.ContextVar("replica", default=None)
+
+def replicas():
+    return [alias for alias in project_settings.DATABASES if alias != PRIMARY]
+
+class ReplicaRouter():
+    def db_for_read(self, model, **hints):
+        if model._meta.model_name in PRIMARY_MODELS:
+            return PRIMARY
+        return replica.get() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+class ReplicaMiddleware():
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replicas():
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+
+        if self.is_async:
+            async_support.mark_coroutine(self)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in ["GET", "HEAD"] and \
+                request.resolver_match.url_name in READ_VIEWS and \
+                STICKY_COOKIE not in request.COOKIES:
+            replica.set(random.choice(replicas()))
+
+    def process_response(self, request, response):
+        match = request.resolver_match
+        if request.method not in ["GET", "HEAD"] or (match and match.url_name in WRITE_VIEWS):
+            response.set_cookie(STICKY_COOKIE, "1",
+                                max_age=settings.REPLICA_STICKY_SECONDS,
+                                secure=(not project_settings.DEBUG),
+                                httponly=True)
+        return response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        token = replica.set(None)
+        try:
+            return self.process_response(request, self.get_response(request))
+        finally:
+            replica.reset(token)
+
+    async def __acall__(self, request):
+        token = replica.set(None)
+        try:
+            return self.process_response(request, await self.get_response(request))
+        finally:
+            replica.reset(token)
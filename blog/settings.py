@@ -16,6 +16,7 @@
 #
 
 from django.conf import settings as project_settings
+import os
 
 POSTS_PER_PAGE = int(project_settings.CONFIG["Blog"]["posts_per_page"])
 ATOM_POSTS = int(project_settings.CONFIG["Blog"]["atom_posts"])
@@ -27,3 +28,76 @@ GOOGLE_OAUTH2_CLIENT_SECRET = project_settings.CONFIG["Secrets"]["google_oauth2_
 
 GITHUB_OAUTH2_CLIENT_ID = project_settings.CONFIG["Secrets"]["github_oauth2_client_id"]
 GITHUB_OAUTH2_CLIENT_SECRET = project_settings.CONFIG["Secrets"]["github_oauth2_client_secret"]
+
+SLOW_QUERY_LOG = project_settings.CONFIG.getboolean("Performance", "slow_query_log", fallback=False)
+SLOW_QUERY_THRESHOLD = project_settings.CONFIG.getfloat("Performance", "slow_query_threshold", fallback=0.2)
+SLOW_QUERY_LOG_FILE = project_settings.CONFIG.get("Performance", "slow_query_log_file",
+                                                  fallback=os.path.join(project_settings.BASE_DIR, "slow_queries.log"))
+SLOW_QUERY_LOG_MAX_BYTES = project_settings.CONFIG.getint("Performance", "slow_query_log_max_bytes", fallback=1048576)
+SLOW_QUERY_LOG_BACKUPS = project_settings.CONFIG.getint("Performance", "slow_query_log_backups", fallback=3)
+
+PROFILE_SAMPLE_RATE = project_settings.CONFIG.getfloat("Performance", "profile_sample_rate", fallback=0.0)
+PROFILE_SAMPLE_INTERVAL = project_settings.CONFIG.getfloat("Performance", "profile_sample_interval", fallback=0.005)
+PROFILE_DIR = project_settings.CONFIG.get("Performance", "profile_dir",
+                                          fallback=os.path.join(project_settings.BASE_DIR, "profiles"))
+PROFILE_MAX_FILES = project_settings.CONFIG.getint("Performance", "profile_max_files", fallback=50)
+PROFILE_MAX_AGE_DAYS = project_settings.CONFIG.getint("Performance", "profile_max_age_days", fallback=7)
+
+FRAGMENT_CACHE_TIMEOUT = project_settings.CONFIG.getint("Performance", "fragment_cache_timeout", fallback=86400)
+
+SITEMAP_DIR = project_settings.CONFIG.get("Performance", "sitemap_dir",
+                                          fallback=os.path.join(project_settings.BASE_DIR, "sitemaps"))
+
+MAX_UPLOAD_SIZE = project_settings.CONFIG.getint("Blog", "max_upload_size", fallback=50 * 1024 * 1024)
+MAX_BACKUP_SIZE = project_settings.CONFIG.getint("Blog", "max_backup_size", fallback=1024 * 1024 * 1024)
+BACKUP_SPOOL_SIZE = project_settings.CONFIG.getint("Blog", "backup_spool_size", fallback=16 * 1024 * 1024)
+
+REPLICA_STICKY_SECONDS = project_settings.CONFIG.getint("Performance", "replica_sticky_seconds", fallback=10)
+
+SQLITE_LOCKED_RETRIES = project_settings.CONFIG.getint("Performance", "sqlite_locked_retries", fallback=5)
+SQLITE_LOCKED_BACKOFF = project_settings.CONFIG.getfloat("Performance", "sqlite_locked_backoff", fallback=0.05)
+
+COMPRESSION_MIN_SIZE = project_settings.CONFIG.getint("Performance", "compression_min_size", fallback=512)
+COMPRESSION_CACHE_MAX_SIZE = project_settings.CONFIG.getint("Performance", "compression_cache_max_size", fallback=1048576)
+COMPRESSION_CACHE_TIMEOUT = project_settings.CONFIG.getint("Performance", "compression_cache_timeout", fallback=3600)
+
+INVALIDATION_BUS = project_settings.CONFIG.getboolean("Performance", "invalidation_bus", fallback=False)
+INVALIDATION_POLL_INTERVAL = project_settings.CONFIG.getfloat("Performance", "invalidation_poll_interval", fallback=1.0)
+INVALIDATION_RETENTION = project_settings.CONFIG.getint("Performance", "invalidation_retention", fallback=3600)
+
+RENDER_CACHE = project_settings.CONFIG.getboolean("Performance", "render_cache", fallback=False)
+RENDER_CACHE_MAX_AGE = project_settings.CONFIG.getint("Performance", "render_cache_max_age", fallback=600)
+RENDER_CACHE_TIMEOUT = project_settings.CONFIG.getint("Performance", "render_cache_timeout", fallback=7 * 86400)
+
+ADMIN_PAGE_SIZE = project_settings.CONFIG.getint("Blog", "admin_page_size", fallback=50)
+
+RELATED_POSTS = project_settings.CONFIG.getint("Blog", "related_posts", fallback=5)
+RELATED_TEXT_WEIGHT = project_settings.CONFIG.getfloat("Blog", "related_text_weight", fallback=0.0)
+
+VIEW_COUNT_FLUSH_INTERVAL = project_settings.CONFIG.getfloat("Performance", "view_count_flush_interval", fallback=30.0)
+POPULARITY_DECAY_DAYS = project_settings.CONFIG.getfloat("Blog", "popularity_decay_days", fallback=30.0)
+POPULAR_POSTS = project_settings.CONFIG.getint("Blog", "popular_posts", fallback=5)
+
+ANALYTICS = project_settings.CONFIG.getboolean("Performance", "analytics", fallback=False)
+ANALYTICS_FLUSH_INTERVAL = project_settings.CONFIG.getfloat("Performance", "analytics_flush_interval", fallback=10.0)
+ANALYTICS_ROLLUP_INTERVAL = project_settings.CONFIG.getfloat("Performance", "analytics_rollup_interval", fallback=0.0)
+ANALYTICS_HOURLY_RETENTION_DAYS = project_settings.CONFIG.getint("Performance", "analytics_hourly_retention_days", fallback=14)
+ANALYTICS_TOP_URLS = project_settings.CONFIG.getint("Blog", "analytics_top_urls", fallback=20)
+# Proxies appending to X-Forwarded-For in front of the site (the Heroku router)
+ANALYTICS_PROXY_HOPS = project_settings.CONFIG.getint("Performance", "analytics_proxy_hops", fallback=1)
+
+REVISION_SNAPSHOT_INTERVAL = project_settings.CONFIG.getint("Blog", "revision_snapshot_interval", fallback=10)
+
+BODY_COMPRESSION = project_settings.CONFIG.get("Performance", "body_compression", fallback="none")
+BODY_COMPRESSION_MIN_SIZE = project_settings.CONFIG.getint("Performance", "body_compression_min_size", fallback=1024)
+BODY_CACHE_SIZE = project_settings.CONFIG.getint("Performance", "body_cache_size", fallback=256)
+
+FILE_GC_BACKGROUND = project_settings.CONFIG.getboolean("Performance", "file_gc_background", fallback=True)
+FILE_GC_BATCH_SIZE = project_settings.CONFIG.getint("Performance", "file_gc_batch_size", fallback=500)
+FILE_GC_GRACE_PERIOD = project_settings.CONFIG.getint("Performance", "file_gc_grace_period", fallback=3600)
+FILE_GC_INTERVAL = project_settings.CONFIG.getint("Performance", "file_gc_interval", fallback=3600)
+
+URL_CACHE_SIZE = project_settings.CONFIG.getint("Performance", "url_cache_size", fallback=4096)
+
+API_PAGE_SIZE = project_settings.CONFIG.getint("Blog", "api_page_size", fallback=20)
+API_MAX_PAGE_SIZE = project_settings.CONFIG.getint("Blog", "api_max_page_size", fallback=100)
@@ -0,0 +1,129 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+from django.db.models import Max
+from django.db.models.functions import ExtractYear
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.urls import reverse
+from django.conf import settings as project_settings
+from django.utils.html import escape
+from datetime import datetime
+import os
+
+from . import models
+from . import settings
+from . import invalidation
+
+INDEX = "sitemap.xml"
+PAGES = "sitemap-pages.xml"
+
+def year_filename(year):
+    return "sitemap-{}.xml".format(year)
+
+def w3c_date(date):
+    return date.strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+def urlset(urls):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+    for loc, lastmod in urls:
+        lines.append("<url><loc>{}</loc><lastmod>{}</lastmod></url>".format(escape(loc), w3c_date(lastmod)))
+    lines.append("</urlset>")
+    return "\n".join(lines)
+
+def build_index():
+    years = models.Post.objects.filter(draft__exact=False) \
+        .annotate(year=ExtractYear('date')).values('year') \
+        .annotate(lastmod=Max('edit_date')).order_by('year')
+
+    sitemaps = [(reverse('sitemap_year', kwargs={"year": year["year"]}), year["lastmod"]) for year in years]
+
+    pages_lastmod = models.Page.objects.aggregate(lastmod=Max('edit_date'))["lastmod"]
+    if pages_lastmod:
+        sitemaps.append((reverse('sitemap_pages'), pages_lastmod))
+
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+    for path, lastmod in sitemaps:
+        lines.append("<sitemap><loc>{}{}</loc><lastmod>{}</lastmod></sitemap>".format(
+            project_settings.SECURE_SITE_URL, path, w3c_date(lastmod)))
+    lines.append("</sitemapindex>")
+    return "\n".join(lines)
+
+def build_year(year):
+    posts = models.Post.objects.filter(draft__exact=False, date__year=year) \
+        .only('path', 'edit_date').order_by('date')
+
+    return urlset((project_settings.SECURE_SITE_URL + post.get_absolute_url(), post.edit_date) for post in posts)
+
+def build_pages():
+    pages = models.Page.objects.only('path', 'edit_date').order_by('pk')
+
+    return urlset((project_settings.SECURE_SITE_URL + page.get_absolute_url(), page.edit_date) for page in pages)
+
+def get_sitemap(filename, build):
+    path = os.path.join(settings.SITEMAP_DIR, filename)
+
+    try:
+        with open(path, "rb") as f:
+            return f.read(), os.fstat(f.fileno()).st_mtime
+    except FileNotFoundError:
+        pass
+
+    content = build().encode("utf-8")
+
+    os.makedirs(settings.SITEMAP_DIR, exist_ok=True)
+    tmp_path = "{}.{}.tmp".format(path, os.urandom(4).hex())
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+    return content, os.path.getmtime(path)
+
+def invalidate(*filenames):
+    for filename in filenames:
+        try:
+            os.remove(os.path.join(settings.SITEMAP_DIR, filename))
+        except FileNotFoundError:
+            pass
+
+def invalidate_all(pk=None):
+    if os.path.isdir(settings.SITEMAP_DIR):
+        invalidate(*(filename for filename in os.listdir(settings.SITEMAP_DIR) if filename.endswith(".xml")))
+
+# The files are on the local disk of each dyno, and the old year of a post
+# changed elsewhere is not known here
+invalidation.subscribe("post", invalidate_all)
+invalidation.subscribe("page", invalidate_all)
+
+@receiver(post_save, sender=models.Post)
+@receiver(post_delete, sender=models.Post)
+def post_changed(sender, instance, **kwargs):
+    years = {instance.date.year}
+
+    # A post moved to another year must also leave the old sitemap
+    loaded_date = getattr(instance, "_loaded_values", {}).get("date")
+    if isinstance(loaded_date, datetime):
+        years.add(loaded_date.year)
+
+    invalidate(INDEX, *(year_filename(year) for year in years))
+
+@receiver(post_save, sender=models.Page)
+@receiver(post_delete, sender=models.Page)
+def page_changed(sender, instance, **kwargs):
+    invalidate(INDEX, PAGES)
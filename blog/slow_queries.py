@@ -0,0 +1,194 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+import contextlib
+from datetime import datetime
+import logging
+import logging.handlers
+import threading
+import traceback
+import hashlib
+import json
+import time
+import os
+import re
+
+from . import settings
+
+BLOG_DIR = os.path.dirname(os.path.abspath(__file__))
+THIS_FILE = os.path.abspath(__file__)
+
+logger = logging.getLogger("code.blog.slow_queries")
+
+# Fingerprints already explained by this process
+explained = set()
+explained_lock = threading.Lock()
+
+def normalize_sql(sql):
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(\.\d+)?\b", "?", sql)
+    sql = re.sub(r"%s", "?", sql)
+    # IN lists have a variable number of placeholders
+    sql = re.sub(r"\(\s*\?(\s*,\s*\?)*\s*\)", "(...)", sql)
+    return re.sub(r"\s+", " ", sql).strip()
+
+def fingerprint(sql):
+    return hashlib.md5(normalize_sql(sql).lower().encode("utf-8")).hexdigest()[:16]
+
+def originating_frame():
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(BLOG_DIR) and filename != THIS_FILE:
+            return "{}:{} in {}".format(os.path.relpath(filename, BLOG_DIR), frame.lineno, frame.name)
+    return None
+
+def explain(alias, sql, params):
+    if not sql.lstrip().upper().startswith("SELECT"):
+        return None
+
+    db = connections[alias]
+    if db.vendor == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif db.vendor == "postgresql":
+        prefix = "EXPLAIN "
+    else:
+        return None
+
+    with db.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+
+def write_log(queries):
+    try:
+        for query in queries:
+            query["fingerprint"] = fingerprint(query["sql"])
+
+            with explained_lock:
+                first_time = query["fingerprint"] not in explained
+                explained.add(query["fingerprint"])
+
+            if first_time:
+                try:
+                    query["explain"] = explain(query["alias"], query["sql"], query["params"])
+                except Exception as e:
+                    query["explain"] = "EXPLAIN failed: {}".format(e)
+
+            logger.info(json.dumps(query, default=str))
+    finally:
+        # Connections opened by this thread must not be leaked
+        connections.close_all()
+
+def read_log():
+    paths = [settings.SLOW_QUERY_LOG_FILE]
+    for n in range(1, settings.SLOW_QUERY_LOG_BACKUPS + 1):
+        paths.append("{}.{}".format(settings.SLOW_QUERY_LOG_FILE, n))
+
+    entries = []
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        pass
+
+    return entries
+
+def report():
+    queries = {}
+    for entry in read_log():
+        query = queries.setdefault(entry["fingerprint"], {
+            "fingerprint": entry["fingerprint"],
+            "sql": normalize_sql(entry["sql"]),
+            "count": 0,
+            "total": 0,
+            "max": 0,
+            "views": set(),
+            "frames": set(),
+            "explain": None,
+            "last_seen": entry["date"],
+        })
+        query["count"] += 1
+        query["total"] += entry["duration"]
+        query["max"] = max(query["max"], entry["duration"])
+        query["last_seen"] = max(query["last_seen"], entry["date"])
+        if entry["view"]:
+            query["views"].add(entry["view"])
+        if entry["frame"]:
+            query["frames"].add(entry["frame"])
+        if entry.get("explain"):
+            query["explain"] = entry["explain"]
+
+    return sorted(queries.values(), key=lambda query: query["total"], reverse=True)
+
+class QueryRecorder():
+    def __init__(self, request):
+        self.request = request
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if duration >= settings.SLOW_QUERY_THRESHOLD and not many:
+                match = self.request.resolver_match
+                self.slow.append({
+                    "date": datetime.utcnow().isoformat(),
+                    "duration": duration,
+                    "sql": sql,
+                    "params": params,
+                    "alias": context["connection"].alias,
+                    "view": match.view_name if match else None,
+                    "path": self.request.path,
+                    "frame": originating_frame(),
+                })
+
+class SlowQueryMiddleware():
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+
+        if not logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(
+                settings.SLOW_QUERY_LOG_FILE,
+                maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+                backupCount=settings.SLOW_QUERY_LOG_BACKUPS)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+    def __call__(self, request):
+        recorder = QueryRecorder(request)
+
+        with contextlib.ExitStack() as stack:
+            for db in connections.all():
+                stack.enter_context(db.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        # EXPLAIN and logging happen off the request path
+        if recorder.slow:
+            threading.Thread(target=write_log, args=(recorder.slow,), daemon=True).start()
+
+        return response
@@ -0,0 +1,59 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+from django.conf import settings as project_settings
+from django.db import transaction, OperationalError
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+import functools
+import random
+import time
+
+from . import settings
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    pragmas = getattr(project_settings, "SQLITE_PRAGMAS", None)
+
+    if connection.vendor == "sqlite" and pragmas:
+        with connection.cursor() as cursor:
+            for name, value in pragmas.items():
+                cursor.execute("PRAGMA {} = {}".format(name, value))
+
+def is_locked(error):
+    return "database is locked" in str(error) or "database table is locked" in str(error)
+
+def retry_when_locked(func):
+    # SQLite fails immediately, without waiting for the busy timeout, when
+    # a deferred transaction can't upgrade to a write lock: retry the whole
+    # transaction after a random backoff. Inside an atomic block the
+    # transaction isn't ours to retry: the error goes to its owner.
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if transaction.get_connection().in_atomic_block:
+            return func(*args, **kwargs)
+
+        for attempt in range(settings.SQLITE_LOCKED_RETRIES):
+            try:
+                with transaction.atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as e:
+                if not is_locked(e) or attempt == settings.SQLITE_LOCKED_RETRIES - 1:
+                    raise
+                time.sleep(settings.SQLITE_LOCKED_BACKOFF * (2 ** attempt) * random.random())
+
+    return wrapper
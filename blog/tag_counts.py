@@ -0,0 +1,80 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Keeps Tag.published_posts_count in sync with Post.tags and the draft
+# state of the posts. Counts are recomputed for the touched tags only,
+# which also repairs any drift.
+
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+import math
+
+from . import models
+
+PostTag = models.Post.tags.through
+
+# Font size steps of the tag cloud
+CLOUD_SIZES = 5
+
+def recount(tag_pks):
+    tag_pks = list(tag_pks)
+    if not tag_pks:
+        return
+
+    models.Tag.objects.filter(pk__in=tag_pks).update(published_posts_count=Coalesce(Subquery(
+        PostTag.objects.filter(tag_id=OuterRef('pk'), post__draft=False)
+            .values('tag_id').annotate(count=Count('pk')).values('count'),
+        output_field=IntegerField()), 0))
+
+def rebuild():
+    recount(models.Tag.objects.values_list('pk', flat=True))
+
+def cloud():
+    tags = list(models.Tag.objects.filter(published_posts_count__gt=0).order_by('name'))
+    if tags:
+        largest = math.log(1 + max(tag.published_posts_count for tag in tags))
+        for tag in tags:
+            tag.size = 1 + round((CLOUD_SIZES - 1) * math.log(1 + tag.published_posts_count) / largest)
+    return tags
+
+@receiver(m2m_changed, sender=PostTag)
+def post_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ["post_add", "post_remove", "post_clear"]:
+            recount([instance.pk])
+    elif action == "pre_clear":
+        instance._cleared_tags = list(instance.tags.values_list('pk', flat=True))
+    elif action == "post_clear":
+        recount(getattr(instance, "_cleared_tags", []))
+    elif action in ["post_add", "post_remove"]:
+        recount(pk_set)
+
+@receiver(post_save, sender=models.Post)
+def post_saved(sender, instance, created, **kwargs):
+    loaded = getattr(instance, "_loaded_values", {})
+    if not created and loaded.get("draft", instance.draft) != instance.draft:
+        recount(PostTag.objects.filter(post_id=instance.pk).values_list('tag_id', flat=True))
+
+@receiver(pre_delete, sender=models.Post)
+def post_deleting(sender, instance, **kwargs):
+    instance._deleted_tags = list(PostTag.objects.filter(post_id=instance.pk).values_list('tag_id', flat=True))
+
+@receiver(post_delete, sender=models.Post)
+def post_deleted(sender, instance, **kwargs):
+    recount(getattr(instance, "_deleted_tags", []))
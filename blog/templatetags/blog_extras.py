@@ -0,0 +1,71 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+from django import template
+from django.utils.safestring import mark_safe
+
+from .. import fragments
+from .. import archive
+from .. import tag_counts
+from .. import links
+
+register = template.Library()
+
+class PostFragmentNode(template.Node):
+    def __init__(self, nodelist, name, post, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.post = post
+        self.vary_on = vary_on
+
+    def render(self, context):
+        post = self.post.resolve(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+
+        return mark_safe(fragments.get_or_render(
+            self.name.resolve(context), post, lambda: self.nodelist.render(context), vary_on))
+
+# Caches the enclosed fragment until the post, its tags or its comments change:
+# {% postfragment "comments" post [vary_on ...] %}...{% endpostfragment %}
+@register.tag
+def postfragment(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError("'postfragment' tag requires a name and a post")
+
+    nodelist = parser.parse(("endpostfragment",))
+    parser.delete_first_token()
+
+    return PostFragmentNode(nodelist,
+                            parser.compile_filter(bits[1]),
+                            parser.compile_filter(bits[2]),
+                            [parser.compile_filter(bit) for bit in bits[3:]])
+
+# Years and months with published posts: {% archive_sidebar %}
+@register.inclusion_tag("blog/archive_sidebar.html")
+def archive_sidebar():
+    return {"years": archive.years()}
+
+# Tags with published posts, sized by their number: {% tag_cloud %}
+@register.inclusion_tag("blog/tag_cloud.html")
+def tag_cloud():
+    return {"tags": tag_counts.cloud()}
+
+# Like {% url %} with positional arguments, memoized: {% cached_url "tag" tag.uid %}
+@register.simple_tag
+def cached_url(name, *args):
+    return links.url(name, *args)
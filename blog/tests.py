@@ -0,0 +1,198 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Run with: python manage.py test code.blog
+# Tests run with a local SQLite replica (see settings.py), or the ones in
+# SQLITE_REPLICAS.
+
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from datetime import datetime
+from unittest import mock
+import unittest
+import os
+
+from . import links
+from . import models
+from . import routers
+from . import settings
+from . import fragments
+from . import invalidation
+from . import render_cache
+
+def cache_entry(path):
+    return render_cache.cache.get(render_cache.cache_key(path))
+
+def executed_sql(queries):
+    return " ".join(query["sql"] for query in queries.captured_queries)
+
+def replicate(replica):
+    # The whole primary copied to the replica, as replication would
+    primary = connections["default"]
+    primary.ensure_connection()
+    connections[replica].ensure_connection()
+    primary.connection.backup(connections[replica].connection)
+
+class ReplicaRoutingTests(TransactionTestCase):
+    # The replica is a separate test database, the data is copied to it
+    # once set up
+    databases = "__all__"
+
+    def setUp(self):
+        self.replica = routers.replicas()[0]
+
+        self.user = models.User.objects.create(username="writer", name="Writer", email="", picture_url="",
+                                               level=models.UserLevel.FULL, session_id="a" * 32)
+        self.post = models.Post(uid="post", title="Post", body="", draft=False, date=datetime(2018, 1, 1))
+        self.post.save()
+        attachment = models.File.objects.create(name="a.txt", content=b"content")
+        self.post.files.add(attachment)
+
+        self.file_url = self.post.get_absolute_url() + "a.txt/"
+        replicate(self.replica)
+
+    def get_file(self):
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections[self.replica]) as replica:
+            response = self.client.get(self.file_url, secure=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"content")
+        return primary, replica
+
+    def test_reads_use_a_replica(self):
+        with mock.patch("random.choice", lambda choices: self.replica):
+            primary, replica = self.get_file()
+
+        self.assertIn("blog_post", executed_sql(replica))
+        self.assertNotIn("blog_post", executed_sql(primary))
+        self.assertNotIn(routers.STICKY_COOKIE, self.client.cookies)
+
+    def test_writes_use_the_primary(self):
+        token = routers.replica.set(self.replica)
+        try:
+            self.assertEqual(models.Post.objects.all().db, self.replica)
+            self.assertEqual(models.User.objects.all().db, "default")
+
+            with CaptureQueriesContext(connections[self.replica]) as replica:
+                models.Post.objects.filter(pk=self.post.pk).update(title="Changed")
+            self.assertEqual(len(replica), 0)
+        finally:
+            routers.replica.reset(token)
+
+    def test_reads_after_a_write_use_the_primary(self):
+        self.client.cookies["session_id"] = "writer=" + "a" * 32
+        with CaptureQueriesContext(connections["default"]) as primary:
+            response = self.client.post("/submit_comment/{}/".format(self.post.pk), {"comment": "Hello"},
+                                        secure=True, HTTP_REFERER=self.post.get_absolute_url())
+
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("blog_comment", executed_sql(primary))
+        self.assertIn(routers.STICKY_COOKIE, response.cookies)
+
+        primary, replica = self.get_file()
+        self.assertIn("blog_post", executed_sql(primary))
+        self.assertEqual(len(replica), 0)
+
+
+@unittest.skipIf(connections["default"].vendor == "postgresql", "events go through LISTEN/NOTIFY")
+class InvalidationTests(TransactionTestCase):
+    def setUp(self):
+        for name in ["INVALIDATION_BUS", "RENDER_CACHE"]:
+            patcher = mock.patch.object(settings, name, True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # The render cache worker would render the pages, only the tasks
+        # are kept
+        self.tasks = []
+        patcher = mock.patch.object(render_cache, "schedule", lambda tasks: self.tasks.extend(tasks))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.post = models.Post(uid="post", title="Post", body="", draft=False, date=datetime(2018, 1, 1))
+        self.post.save()
+        self.path = self.post.get_absolute_url()
+
+    def write_in_other_process(self, write):
+        # The child gets its own connection and its own copy of the caches
+        connections.close_all()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                with transaction.atomic():
+                    write()
+                os._exit(0)
+            except BaseException:
+                os._exit(1)
+
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+
+    def run_tasks(self):
+        while self.tasks:
+            kind, value = self.tasks.pop(0)
+            if kind != "path":
+                render_cache.mark_stale(render_cache.paths_for(kind, value))
+
+    def test_other_process_writes_reach_the_caches(self):
+        fragment_versions = fragments.versions(self.post)
+        render_cache.store(self.path, HttpResponse("Post"))
+        last = invalidation.last_event()
+
+        def edit():
+            post = models.Post.objects.get(pk=self.post.pk)
+            post.title = "Changed"
+            post.save()
+
+        self.write_in_other_process(edit)
+
+        # Nothing changes here until the event is read
+        self.assertEqual(fragments.versions(self.post), fragment_versions)
+        self.assertFalse(cache_entry(self.path)["stale"])
+
+        invalidation.poll(last)
+        self.run_tasks()
+
+        self.assertNotEqual(fragments.versions(self.post), fragment_versions)
+        self.assertTrue(cache_entry(self.path)["stale"])
+
+    def test_own_events_are_skipped(self):
+        last = invalidation.last_event()
+        with transaction.atomic():
+            self.post.title = "Changed"
+            self.post.save()
+        self.tasks.clear()
+
+        fragment_versions = fragments.versions(self.post)
+        invalidation.poll(last)
+
+        self.assertEqual(fragments.versions(self.post), fragment_versions)
+        self.assertEqual(self.tasks, [])
+
+class LinksTests(SimpleTestCase):
+    def test_paths_follow_the_url_patterns(self):
+        self.assertEqual(links.post_path(2018, 3, "post"), links.strip_prefix(reverse("post", args=[2018, "03", "post"])))
+        self.assertEqual(links.page_path("page"), links.strip_prefix(reverse("page", args=["page"])))
+
+    def test_lookups_dont_fill_the_url_cache(self):
+        links.cached_reverse.cache_clear()
+        links.post_path(2018, 3, "missing")
+        links.page_path("missing")
+        self.assertEqual(links.cached_reverse.cache_info().currsize, 0)
@@ -0,0 +1,94 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+from django.core.exceptions import RequestDataTooBig
+import tempfile
+import hashlib
+import io
+
+from . import settings
+
+CHUNK_SIZE = 64 * 1024
+
+def read_chunks(chunks, max_size):
+    # The hash and the limit are computed as the chunks arrive. The blob is
+    # a database column and is written whole, but it is built in a single
+    # buffer: getvalue() hands it over without copying.
+    digest = hashlib.sha256()
+    buffer = io.BytesIO()
+    size = 0
+
+    for chunk in chunks:
+        size += len(chunk)
+        if size > max_size:
+            raise RequestDataTooBig("File larger than {} bytes".format(max_size))
+        digest.update(chunk)
+        buffer.write(chunk)
+
+    return buffer.getvalue(), size, digest.hexdigest()
+
+def store(f, chunks, max_size):
+    content, size, checksum = read_chunks(chunks, max_size)
+
+    # Rewriting an unchanged blob is the expensive part, skip it
+    if f.pk is None or f.checksum != checksum:
+        f.content = content
+        f.size = size
+        f.checksum = checksum
+        f.save()
+
+    return f
+
+def check_uploads(files):
+    # Before the document is touched, so that a rejected upload leaves it
+    # as it was
+    for name in files:
+        uploaded = files[name]
+        if uploaded.size is not None and uploaded.size > settings.MAX_UPLOAD_SIZE:
+            raise RequestDataTooBig("File larger than {} bytes".format(settings.MAX_UPLOAD_SIZE))
+
+def store_upload(f, uploaded):
+    if uploaded.size is not None and uploaded.size > settings.MAX_UPLOAD_SIZE:
+        raise RequestDataTooBig("File larger than {} bytes".format(settings.MAX_UPLOAD_SIZE))
+
+    return store(f, uploaded.chunks(CHUNK_SIZE), settings.MAX_UPLOAD_SIZE)
+
+def store_stream(f, stream, max_size):
+    return store(f, iter(lambda: stream.read(CHUNK_SIZE), b""), max_size)
+
+def check_archive(archive, max_size):
+    # Sizes from the zip directory, the members are limited again while
+    # they are read
+    for info in archive.infolist():
+        if info.file_size > max_size:
+            raise RequestDataTooBig("{} larger than {} bytes".format(info.filename, max_size))
+
+def spool_upload(uploaded):
+    # Copies the upload to a file with random access that only stays in
+    # memory while small
+    spooled = tempfile.SpooledTemporaryFile(max_size=settings.BACKUP_SPOOL_SIZE)
+
+    size = 0
+    for chunk in uploaded.chunks(CHUNK_SIZE):
+        size += len(chunk)
+        if size > settings.MAX_BACKUP_SIZE:
+            spooled.close()
+            raise RequestDataTooBig("Backup larger than {} bytes".format(settings.MAX_BACKUP_SIZE))
+        spooled.write(chunk)
+
+    spooled.seek(0)
+    return spooled
@@ -16,24 +16,38 @@
 #
 
 from django.urls import path
+from django.conf import settings as project_settings
 
 from . import views
+from . import api
+
+if project_settings.ASYNC_VIEWS:
+    from . import async_views as read_views
+else:
+    read_views = views
 
 urlpatterns = [
     # Blog
-    path('', views.index, name='index'),
-    path('posts/<int:page_number>/', views.index, name="index"),
-    path('author/<username>/', views.author, name="author"),
-    path('author/<username>/<int:page_number>/', views.author, name="author"),
-    path('tag/<tag_uid>/', views.tag, name="tag"),
-    path('tag/<tag_uid>/<int:page_number>/', views.tag, name="tag"),
-    path('<int:year>/<int:month>/<slug:uid>/', views.post, name="post"),
-    path('<int:year>/<int:month>/<slug:uid>/<filename>/', views.post_file, name="post_file"),
+    path('', read_views.index, name='index'),
+    path('posts/<int:page_number>/', read_views.index, name="index"),
+    path('author/<username>/', read_views.author, name="author"),
+    path('author/<username>/<int:page_number>/', read_views.author, name="author"),
+    path('tags/', views.tags, name="tags"),
+    path('tag/<tag_uid>/', read_views.tag, name="tag"),
+    path('tag/<tag_uid>/<int:page_number>/', read_views.tag, name="tag"),
+    path('<int:year>/<int:month>/<slug:uid>/', read_views.post, name="post"),
+    path('<int:year>/<int:month>/<slug:uid>/<filename>/', read_views.post_file, name="post_file"),
     path('submit_comment/<int:pk>/', views.submit_comment, name="submit_comment"),
     path('toggle_delete_comment/<int:pk>/', views.toggle_delete_comment, name="toggle_delete_comment"),
-    path('feed/', views.feed, name="feed"),
-    path('tag/<tag_uid>/feed/', views.feed, name="tag_feed"),
-    path('author/<username>/feed/', views.feed, name="author_feed"),
+    path('feed/', read_views.feed, name="feed"),
+    path('tag/<tag_uid>/feed/', read_views.feed, name="tag_feed"),
+    path('author/<username>/feed/', read_views.feed, name="author_feed"),
+    path('archive/', views.archive_index, name="archive"),
+    path('archive/<int:year>/', views.archive_year, name="archive_year"),
+    path('archive/<int:year>/<int:month>/', views.archive_month, name="archive_month"),
+    path('sitemap.xml', views.sitemap, name="sitemap"),
+    path('sitemap-<int:year>.xml', views.sitemap_year, name="sitemap_year"),
+    path('sitemap-pages.xml', views.sitemap_pages, name="sitemap_pages"),
     
     # Login
     path('oauth2_login/<provider>/', views.oauth2_login, name="oauth2_login"),
@@ -48,11 +62,24 @@ urlpatterns = [
     path('admin/edit_post/', views.admin_edit_post, name='admin_edit_post'),
     path('admin/edit_page/', views.admin_edit_page, name='admin_edit_page'),
     path('admin/delete_file/<doc_type>/<pk>/<filename>/', views.admin_delete_file, name='admin_delete_file'),
+    path('admin/revisions/<doc_type>/<pk>/', views.admin_revisions, name='admin_revisions'),
     path('admin/backup_overview', views.admin_backup_overview, name='admin_backup_overview'),
     path('admin/backup', views.admin_backup, name='admin_backup'),
     path('admin/restore_backup', views.admin_restore_backup, name='admin_restore_backup'),
+    path('admin/slow_queries/', views.admin_slow_queries, name='admin_slow_queries'),
+    path('admin/profiles/', views.admin_profiles, name='admin_profiles'),
+    path('admin/profiles/<name>.<kind>', views.admin_profile_file, name='admin_profile_file'),
+    path('admin/analytics/', views.admin_analytics, name='admin_analytics'),
+    
+    # API
+    path('api/v1/posts/', api.posts, name='api_posts'),
+    path('api/v1/posts/<int:pk>/', api.post, name='api_post'),
+    path('api/v1/pages/', api.pages, name='api_pages'),
+    path('api/v1/pages/<int:pk>/', api.page, name='api_page'),
+    path('api/v1/tags/', api.tags, name='api_tags'),
+    path('api/v1/authors/', api.authors, name='api_authors'),
     
     # Pages
     path('<slug:uid>/', views.page, name="page"),
-    path('<slug:uid>/<filename>/', views.page_file, name="page_file"),
+    path('<slug:uid>/<filename>/', read_views.page_file, name="page_file"),
 ]
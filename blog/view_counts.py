@@ -0,0 +1,142 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+# Post views, counted in memory by each worker and written by a background
+# thread with a single UPDATE every few seconds.
+#
+# Post.popularity decays exponentially with time: a view at time t adds
+# exp((t - start) / tau), so that ordering by popularity ranks recent views
+# higher. To keep the weights finite, start moves forward every
+# EPOCH_LENGTH decay times; the first flush of a new epoch rescales the
+# stored values in one UPDATE, and popularity_epoch records the epoch each
+# value refers to. Changing the decay time makes the stored values
+# meaningless, reset them when doing it.
+
+from django.db import close_old_connections
+from django.db.models import Case, F, FloatField, IntegerField, Value, When
+from django.db.models.functions import Exp
+from django.utils.deprecation import MiddlewareMixin
+from datetime import datetime, timedelta
+import collections
+import threading
+import logging
+import atexit
+import math
+import time
+import os
+
+from . import models
+from . import settings
+
+EPOCH = datetime(2017, 1, 1)
+# In decay times, the largest weight is exp(EPOCH_LENGTH)
+EPOCH_LENGTH = 20
+
+logger = logging.getLogger("code.blog.view_counts")
+
+# Views not written yet, by post uid (unique, and known without a query)
+buffer = collections.Counter()
+buffer_lock = threading.Lock()
+
+flusher_pid = None
+# Last epoch the values were rescaled to by this process
+rescaled_epoch = None
+
+def decay_seconds():
+    return settings.POPULARITY_DECAY_DAYS * 86400
+
+def epoch(date):
+    return int((date - EPOCH).total_seconds() // (decay_seconds() * EPOCH_LENGTH))
+
+def weight(date, number):
+    start = EPOCH + timedelta(seconds=number * decay_seconds() * EPOCH_LENGTH)
+    return math.exp((date - start).total_seconds() / decay_seconds())
+
+def decayed_popularity(number):
+    # The stored value moved to the given epoch, from its own
+    return F('popularity') * Exp((F('popularity_epoch') - number) * float(EPOCH_LENGTH))
+
+def rescale(number):
+    models.Post.objects.filter(popularity_epoch__lt=number, popularity__gt=0).update(
+        popularity=decayed_popularity(number), popularity_epoch=number)
+
+def record(uid):
+    global flusher_pid
+
+    with buffer_lock:
+        buffer[uid] += 1
+
+        if flusher_pid != os.getpid():
+            buffer.clear()
+            buffer[uid] = 1
+            threading.Thread(target=run_flusher, name="view-counts-flusher", daemon=True).start()
+            flusher_pid = os.getpid()
+
+def flush():
+    global buffer, rescaled_epoch
+
+    with buffer_lock:
+        views, buffer = buffer, collections.Counter()
+
+    if not views:
+        return
+
+    now = datetime.utcnow()
+    number = epoch(now)
+    if rescaled_epoch != number:
+        rescale(number)
+        rescaled_epoch = number
+
+    # Rows another worker already moved to a later epoch are brought back
+    # to this one, so that a value always matches its epoch
+    increment = weight(now, number)
+    models.Post.objects.filter(uid__in=list(views)).update(
+        popularity_epoch=number,
+        views=F('views') + Case(*[When(uid=uid, then=Value(count)) for uid, count in views.items()],
+                                output_field=IntegerField()),
+        popularity=decayed_popularity(number) + Case(*[When(uid=uid, then=Value(count * increment))
+                                            for uid, count in views.items()],
+                                          output_field=FloatField()))
+
+def run_flusher():
+    while True:
+        time.sleep(settings.VIEW_COUNT_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            logger.exception("Writing the post views failed")
+        finally:
+            close_old_connections()
+
+@atexit.register
+def flush_at_exit():
+    if flusher_pid == os.getpid():
+        try:
+            flush()
+        except Exception:
+            pass
+
+def popular_posts():
+    return models.Post.objects.filter(draft__exact=False).defer('body').order_by('-popularity')[:settings.POPULAR_POSTS]
+
+class ViewCountMiddleware(MiddlewareMixin):
+    # Before the render cache, so that cached pages count too
+    def process_response(self, request, response):
+        match = request.resolver_match
+        if request.method == "GET" and match and match.url_name == "post" and response.status_code in [200, 304]:
+            record(match.kwargs["uid"])
+        return response
@@ -22,20 +22,36 @@ from django.urls import reverse
 from django.conf import settings as project_settings
 from django.core.exceptions import PermissionDenied
 from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from datetime import datetime, timedelta
-import requests
 import json
 import os
 import unicodedata
 import re
 import mimetypes
-import bleach
-import zipfile
 import io
-import ruamel.yaml as yaml
 
 from . import models
 from . import settings
+from . import slow_queries
+from . import profiling
+from . import sitemaps
+from . import uploads
+from . import pagination
+from . import related
+from . import archive
+from . import tag_counts
+from . import view_counts
+from . import analytics
+from . import revisions
+from . import file_gc
+from . import links
+from .sqlite import retry_when_locked
+from .conditional import conditional, post_validators, page_validators
 
 def str_presenter(dumper, value):
     if "\n" in value:
@@ -43,7 +59,16 @@ def str_presenter(dumper, value):
         return dumper.represent_scalar('tag:yaml.org,2002:str', str(value), style="|")
     return dumper.represent_scalar('tag:yaml.org,2002:str', value, "\"")
 
-yaml.add_representer(str, str_presenter)
+yaml_module = None
+
+def load_yaml():
+    # ruamel.yaml is only needed by backups, load it on first use
+    global yaml_module
+    if yaml_module is None:
+        import ruamel.yaml as yaml
+        yaml.add_representer(str, str_presenter)
+        yaml_module = yaml
+    return yaml_module
 
 oauth2_parameters = {
     "google": {
@@ -114,6 +139,7 @@ def index(request, page_number=0):
     context = {
         "page_number": page_number,
         "logged_user": logged_user,
+        "popular_posts": view_counts.popular_posts(),
     }
     page_number = int(page_number)
     
@@ -176,7 +202,7 @@ def tag(request, tag_uid, page_number=0):
     page_number = int(page_number)
     
     ppp = settings.POSTS_PER_PAGE
-    posts_count = tag.posts.filter(draft__exact=False).count()
+    posts_count = tag.published_posts_count
     
     if posts_count > ppp*page_number:
         context["posts"] = tag.posts.filter(draft__exact=False).order_by('-date')[ppp*page_number:ppp*(page_number+1)]
@@ -193,11 +219,12 @@ def tag(request, tag_uid, page_number=0):
     
     return response
 
+@conditional(post_validators)
 def post(request, year, month, uid):
     logged_user = get_logged_user(request)
     
     try:
-        post = models.Post.objects.filter(date__year=int(year), date__month=int(month)).get(uid=uid)
+        post = models.Post.objects.get(path=links.post_path(year, month, uid))
     except:
         raise Http404()
         
@@ -213,21 +240,24 @@ def post(request, year, month, uid):
 
 def post_file(request, year, month, uid, filename):
     try:
-        post = models.Post.objects.filter(date__year=int(year), date__month=int(month)).get(uid=uid)
+        post = models.Post.objects.get(path=links.post_path(year, month, uid))
         f = post.files.all().get(name=filename)
         
         response = HttpResponse(content=f.content)
-        response['Content-Type'] = mimetypes.guess_type(f.name)
+        response['Content-Type'] = mimetypes.guess_type(f.name)[0] or "application/octet-stream"
         return response
     
     except:
         raise Http404()
 
+@retry_when_locked
 def submit_comment(request, pk):
     redirect_to_secure(request)
     logged_user = get_logged_user(request)
     
     if logged_user and logged_user.COMMENT_WRITE() and request.method == "POST":
+        import bleach
+        
         post = get_object_or_404(models.Post, pk=int(pk))
         
         comment = models.Comment()
@@ -246,6 +276,7 @@ def submit_comment(request, pk):
     else:
         raise PermissionDenied()
 
+@retry_when_locked
 def toggle_delete_comment(request, pk):
     redirect_to_secure(request)
     logged_user = get_logged_user(request)
@@ -262,8 +293,9 @@ def toggle_delete_comment(request, pk):
     
     raise PermissionDenied()
         
+@conditional(page_validators)
 def page(request, uid):
-    page = get_object_or_404(models.Page, uid=uid)
+    page = get_object_or_404(models.Page, path=links.page_path(uid))
     logged_user = get_logged_user(request)
         
     return render(request, "blog/page.html", context={
@@ -278,16 +310,93 @@ def page(request, uid):
 
 def page_file(request, uid, filename):
     try:
-        page = models.Page.objects.get(uid=uid)
+        page = models.Page.objects.get(path=links.page_path(uid))
         f = page.files.all().get(name=filename)
         
         response = HttpResponse(content=f.content)
-        response['Content-Type'] = mimetypes.guess_type(f.name)
+        response['Content-Type'] = mimetypes.guess_type(f.name)[0] or "application/octet-stream"
         return response
     
     except:
         raise Http404()
 
+def tags(request):
+    logged_user = get_logged_user(request)
+    
+    response = render(request, "blog/tags.html", {
+        "tags": tag_counts.cloud(),
+        "logged_user": logged_user,
+    })
+    
+    if logged_user:
+        logged_user.update_session_id(response)
+    
+    return response
+
+def archive_index(request):
+    logged_user = get_logged_user(request)
+    
+    response = render(request, "blog/archive.html", {
+        "years": archive.years(),
+        "logged_user": logged_user,
+    })
+    
+    if logged_user:
+        logged_user.update_session_id(response)
+    
+    return response
+
+def archive_year(request, year):
+    logged_user = get_logged_user(request)
+    
+    months = list(models.MonthlyPostCount.objects.filter(year=year, count__gt=0).order_by('month'))
+    if len(months) == 0:
+        raise Http404()
+    
+    response = render(request, "blog/archive_year.html", {
+        "year": year,
+        "months": months,
+        "posts_count": sum(month.count for month in months),
+        "logged_user": logged_user,
+    })
+    
+    if logged_user:
+        logged_user.update_session_id(response)
+    
+    return response
+
+def archive_month(request, year, month):
+    logged_user = get_logged_user(request)
+    
+    if month < 1 or month > 12:
+        raise Http404()
+    month_count = get_object_or_404(models.MonthlyPostCount, year=year, month=month, count__gt=0)
+    
+    start, end = archive.month_range(year, month)
+    try:
+        posts, next_cursor, previous_cursor = pagination.paginate(
+            models.Post.objects.filter(draft__exact=False, date__gte=start, date__lt=end).defer('body'),
+            ["-date", "-pk"], settings.POSTS_PER_PAGE,
+            request.GET.get("after"), request.GET.get("before"))
+    except pagination.InvalidCursor:
+        # Mangled links land on the first page of the month
+        return redirect("archive_month", year=year, month=month)
+    
+    response = render(request, "blog/archive_month.html", {
+        "year": year,
+        "month": start,
+        "posts": posts,
+        "posts_count": month_count.count,
+        "next_cursor": next_cursor,
+        "previous_cursor": previous_cursor,
+        "logged_user": logged_user,
+    })
+    
+    if logged_user:
+        logged_user.update_session_id(response)
+    
+    return response
+
 def feed(request, tag_uid=None, username=None):
     context = {}
     
@@ -304,6 +413,28 @@ def feed(request, tag_uid=None, username=None):
     
     return render(request, "blog/atom.xml", context, content_type="application/atom+xml")
 
+def serve_sitemap(request, filename, build):
+    content, mtime = sitemaps.get_sitemap(filename, build)
+    
+    response = get_conditional_response(request, last_modified=int(mtime))
+    if response is None:
+        response = HttpResponse(content=content, content_type="application/xml")
+    response['Last-Modified'] = http_date(mtime)
+    
+    return response
+
+def sitemap(request):
+    return serve_sitemap(request, sitemaps.INDEX, sitemaps.build_index)
+
+def sitemap_year(request, year):
+    # Checked first, so that probing years doesn't write a file for each
+    if not models.MonthlyPostCount.objects.filter(year=year, count__gt=0).exists():
+        raise Http404()
+    return serve_sitemap(request, sitemaps.year_filename(year), lambda: sitemaps.build_year(year))
+
+def sitemap_pages(request):
+    return serve_sitemap(request, sitemaps.PAGES, sitemaps.build_pages)
+
 def oauth2_login(request, provider):
     redirect_to_secure(request)
 
@@ -340,6 +471,8 @@ def oauth2callback(request, provider):
     client_secrets = oauth2_parameters[provider]
     
     if request.COOKIES.get("state") == request.GET["state"]:
+        import requests
+        
         r = requests.post(
             client_secrets["token_uri"],
             data = {
@@ -436,14 +569,79 @@ def logout(request):
     else:
         return redirect(reverse("index"), code=302)
 
+POSTS_OVERVIEW_ORDERINGS = {
+    "date": ["date", "pk"],
+    "title": ["title", "pk"],
+    "comments": ["comments_count", "pk"],
+}
+
+USERS_OVERVIEW_ORDERINGS = {
+    "pk": ["pk"],
+    "username": ["username", "pk"],
+    "posts": ["posts_count", "pk"],
+    "comments": ["comments_count", "pk"],
+}
+
+def overview_ordering(request, orderings, default):
+    sort = request.GET.get("sort", default)
+    if sort not in orderings:
+        sort = default
+    descending = request.GET.get("order", "desc") != "asc"
+    
+    return sort, descending, ["-" + field if descending else field for field in orderings[sort]]
+
+def overview_query(request):
+    # Filters and sorting of the current page, for the pagination links
+    query = request.GET.copy()
+    for name in ["after", "before"]:
+        query.pop(name, None)
+    return query.urlencode()
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
 def admin_posts_overview(request):
     redirect_to_secure(request)
     logged_user = get_logged_user(request)
     
     if logged_user and logged_user.POST_WRITE():
+        posts = models.Post.objects.defer('body').annotate(comments_count=Count('comments', distinct=True))
+        
+        draft = request.GET.get("draft", "")
+        if draft in ["yes", "no"]:
+            posts = posts.filter(draft=(draft == "yes"))
+        if request.GET.get("tag"):
+            posts = posts.filter(tags__uid=request.GET["tag"])
+        if request.GET.get("author"):
+            posts = posts.filter(authors__username=request.GET["author"])
+        
+        date_from = parse_date(request.GET.get("date_from"))
+        if date_from:
+            posts = posts.filter(date__gte=date_from)
+        date_to = parse_date(request.GET.get("date_to"))
+        if date_to:
+            posts = posts.filter(date__lt=date_to + timedelta(days=1))
+        
+        sort, descending, ordering = overview_ordering(request, POSTS_OVERVIEW_ORDERINGS, "date")
+        posts, next_cursor, previous_cursor = pagination.paginate(
+            posts.prefetch_related('authors'), ordering, settings.ADMIN_PAGE_SIZE,
+            request.GET.get("after"), request.GET.get("before"))
+        
         response = render(request, "blog/admin_posts_overview.html", {
             "logged_user": logged_user,
-            "posts": models.Post.objects.order_by('-date'),
+            "posts": posts,
+            "tags": models.Tag.objects.order_by('name').values('uid', 'name'),
+            "authors": models.User.objects.filter(level__in=[models.UserLevel.FULL, models.UserLevel.COLLABORATOR])
+                .order_by('name').values('username', 'name'),
+            "filters": request.GET,
+            "sort": sort,
+            "descending": descending,
+            "query": overview_query(request),
+            "next_cursor": next_cursor,
+            "previous_cursor": previous_cursor,
         })
         logged_user.update_session_id(response)
         return response
@@ -457,7 +655,7 @@ def admin_pages_overview(request):
     if logged_user and logged_user.PAGE_WRITE():
         response = render(request, "blog/admin_pages_overview.html", {
             "logged_user": logged_user,
-            "pages": models.Page.objects.order_by('-pk'),
+            "pages": models.Page.objects.defer('body').order_by('-pk'),
         })
         logged_user.update_session_id(response)
         return response
@@ -469,15 +667,49 @@ def admin_users_overview(request):
     logged_user = get_logged_user(request)
     
     if logged_user and logged_user.USER_WRITE():
+        # Counted in subqueries, joining both relations would multiply the
+        # posts of a user by their comments
+        users = models.User.objects.annotate(
+            posts_count=Coalesce(Subquery(
+                models.Post.authors.through.objects.filter(user=OuterRef('pk'))
+                    .values('user').annotate(count=Count('pk')).values('count'),
+                output_field=IntegerField()), 0),
+            comments_count=Coalesce(Subquery(
+                models.Comment.objects.filter(author=OuterRef('pk'))
+                    .values('author').annotate(count=Count('pk')).values('count'),
+                output_field=IntegerField()), 0))
+        
+        blocked = request.GET.get("blocked", "")
+        if blocked in ["yes", "no"]:
+            users = users.filter(blocked=(blocked == "yes"))
+        if request.GET.get("level", "").isdigit():
+            users = users.filter(level=int(request.GET["level"]))
+        if request.GET.get("q"):
+            users = users.filter(Q(username__icontains=request.GET["q"]) | Q(name__icontains=request.GET["q"]))
+        
+        sort, descending, ordering = overview_ordering(request, USERS_OVERVIEW_ORDERINGS, "pk")
+        users, next_cursor, previous_cursor = pagination.paginate(
+            users, ordering, settings.ADMIN_PAGE_SIZE,
+            request.GET.get("after"), request.GET.get("before"))
+        
         response = render(request, "blog/admin_users_overview.html", {
             "logged_user": logged_user,
-            "users": models.User.objects.order_by('-pk'),
+            "users": users,
+            "filters": request.GET,
+            "sort": sort,
+            "descending": descending,
+            "query": overview_query(request),
+            "next_cursor": next_cursor,
+            "previous_cursor": previous_cursor,
         })
         logged_user.update_session_id(response)
         return response
     else:
         raise PermissionDenied()
 
+# Atomic, so that an upload found too large while reading it doesn't leave
+# the edit half saved
+@transaction.atomic
 def admin_edit_post(request):
     redirect_to_secure(request)
     logged_user = get_logged_user(request)
@@ -494,8 +726,11 @@ def admin_edit_post(request):
                     "logged_user": logged_user,
                 })
         elif request.method == "POST":
+            uploads.check_uploads(request.FILES)
+            
             if "pk" in request.POST:
                 post = get_object_or_404(models.Post, pk=int(request.POST["pk"]))
+                revisions.ensure_base("post", post)
                 post.edit_date = datetime.utcnow()
             else:
                 post = models.Post()
@@ -568,14 +803,14 @@ def admin_edit_post(request):
                     uploaded = request.FILES[uploaded]
                     if post.files.filter(name=uploaded.name).count() > 0:
                         f = post.files.all().get(name=uploaded.name)
-                        f.content = uploaded.read()
-                        f.save()
+                        uploads.store_upload(f, uploaded)
                     else:
-                        f = models.File(name=uploaded.name, content=uploaded.read())
-                        f.save()
+                        f = models.File(name=uploaded.name)
+                        uploads.store_upload(f, uploaded)
                         post.files.add(f)
             
             post.save()
+            revisions.record("post", post, logged_user)
             
             if post.draft or request.FILES:
                 response = redirect(reverse("admin_edit_post") + "?pk={}".format(post.pk), code=302)
@@ -588,6 +823,7 @@ def admin_edit_post(request):
     else:
         raise PermissionDenied()
 
+@transaction.atomic
 def admin_edit_page(request):
     redirect_to_secure(request)
     logged_user = get_logged_user(request)
@@ -604,8 +840,11 @@ def admin_edit_page(request):
                     "logged_user": logged_user,
                 })
         elif request.method == "POST":
+            uploads.check_uploads(request.FILES)
+            
             if "pk" in request.POST:
                 page = get_object_or_404(models.Page, pk=int(request.POST["pk"]))
+                revisions.ensure_base("page", page)
                 page.edit_date = datetime.utcnow()
             else:
                 page = models.Page()
@@ -639,17 +878,18 @@ def admin_edit_page(request):
                     uploaded = request.FILES[uploaded]
                     if page.files.filter(name=uploaded.name).count() > 0:
                         f = page.files.all().get(name=uploaded.name)
-                        f.content = uploaded.read()
-                        f.save()
+                        uploads.store_upload(f, uploaded)
                     else:
-                        f = models.File(name=uploaded.name, content=uploaded.read())
-                        f.save()
+                        f = models.File(name=uploaded.name)
+                        uploads.store_upload(f, uploaded)
                         page.files.add(f)
                 
                 page.save()
+                revisions.record("page", page, logged_user)
                 return redirect(reverse("admin_edit_page") + "?pk={}".format(page.pk), code=302)
             
             page.save()
+            revisions.record("page", page, logged_user)
             response = redirect(reverse("admin_pages_overview"), code=302)
             logged_user.update_session_id(response)
             return response
@@ -667,10 +907,11 @@ def admin_delete_file(request, doc_type, pk, filename):
         elif doc_type == "page":
             doc = get_object_or_404(models.Page, pk=int(pk))
         
-        f = doc.files.all().get(name=filename)
+        # Deleted unless another document links it too
+        f = doc.files.all().only('pk').get(name=filename)
         doc.files.remove(f)
         doc.save()
-        f.delete()
+        file_gc.delete_unlinked([f.pk])
         
         response = redirect(request.META['HTTP_REFERER'], code=302)
         logged_user.update_session_id(response)
@@ -695,6 +936,9 @@ def admin_backup(request):
     redirect_to_secure(request)
     logged_user = get_logged_user(request)
     
+    import zipfile
+    yaml = load_yaml()
+    
     f = io.BytesIO()
     z_f = zipfile.ZipFile(f, 'w')
     
@@ -765,6 +1009,15 @@ def admin_backup(request):
         os.path.join("users.yaml"),
         yaml.dump(users, default_flow_style=False, indent=4, block_seq_indent=2)
     )
+    
+    # Save revisions, as stored (compressed deltas)
+    revisions_list = list((revision.to_dict() for revision in
+                           models.Revision.objects.order_by('doc_type', 'object_pk', 'number').iterator()))
+    
+    z_f.writestr(
+        os.path.join("revisions.yaml"),
+        yaml.dump(revisions_list, default_flow_style=False, indent=4, block_seq_indent=2)
+    )
         
     z_f.close()
 
@@ -776,6 +1029,7 @@ def admin_backup(request):
     
     return response
 
+@transaction.atomic
 def admin_restore_backup(request):
     redirect_to_secure(request)
     logged_user = get_logged_user(request)
@@ -783,7 +1037,14 @@ def admin_restore_backup(request):
     if logged_user and logged_user.LEVEL_FULL():
         if request.method == "POST":
             if request.FILES and len(request.FILES) > 0:
-                z_f = zipfile.ZipFile(request.FILES["backup_file"])
+                import zipfile
+                yaml = load_yaml()
+                
+                backup_file = uploads.spool_upload(request.FILES["backup_file"])
+                z_f = zipfile.ZipFile(backup_file)
+                # Before the database is cleared: a failure after that rolls
+                # the whole restore back
+                uploads.check_archive(z_f, settings.MAX_BACKUP_SIZE)
                 
                 info = yaml.safe_load(z_f.open("info.yaml", "r").read())
                 if info['version'] == "1.0":
@@ -794,6 +1055,7 @@ def admin_restore_backup(request):
                     models.User.objects.all().delete()
                     models.File.objects.all().delete()
                     models.Comment.objects.all().delete()
+                    models.Revision.objects.all().delete()
                     
                     # Restore tag
                     tags = yaml.safe_load(z_f.open("tags.yaml", "r").read())
@@ -819,9 +1081,8 @@ def admin_restore_backup(request):
                         for filename in post_dict['files']:
                             f = models.File()
                             f.name = filename
-                            f.content = z_f.open(
-                                os.path.join("posts/", str(pk), filename), "r").read()
-                            f.save()
+                            with z_f.open(os.path.join("posts/", str(pk), filename), "r") as member:
+                                uploads.store_stream(f, member, settings.MAX_BACKUP_SIZE)
                             
                             post.files.add(f)
                         
@@ -839,13 +1100,26 @@ def admin_restore_backup(request):
                         for filename in page_dict['files']:
                             f = models.File()
                             f.name = filename
-                            f.content = z_f.open(
-                                os.path.join("pages/", str(pk), filename), "r").read()
-                            f.save()
+                            with z_f.open(os.path.join("pages/", str(pk), filename), "r") as member:
+                                uploads.store_stream(f, member, settings.MAX_BACKUP_SIZE)
                             
                             page.files.add(f)
                         
                         page.save()
+                    
+                    # Restore revisions, missing in older backups
+                    if "revisions.yaml" in z_f.namelist():
+                        revisions_list = yaml.safe_load(z_f.open("revisions.yaml", "r").read())
+                        for revision_dict in revisions_list:
+                            revision = models.Revision()
+                            revision.from_dict(revision_dict)
+                    
+                    related.rebuild()
+                    archive.rebuild()
+                    tag_counts.rebuild()
+                
+                z_f.close()
+                backup_file.close()
             
         response = redirect(reverse("admin_backup_overview"), code=302)
         logged_user.update_session_id(response)
@@ -853,3 +1127,120 @@ def admin_restore_backup(request):
 
     else:
         raise PermissionDenied()
+
+def admin_slow_queries(request):
+    redirect_to_secure(request)
+    logged_user = get_logged_user(request)
+    
+    if logged_user and logged_user.LEVEL_FULL():
+        response = render(request, "blog/admin_slow_queries.html", {
+            "logged_user": logged_user,
+            "enabled": settings.SLOW_QUERY_LOG,
+            "threshold": settings.SLOW_QUERY_THRESHOLD,
+            "queries": slow_queries.report(),
+        })
+        logged_user.update_session_id(response)
+        return response
+    else:
+        raise PermissionDenied()
+
+def admin_profiles(request):
+    redirect_to_secure(request)
+    logged_user = get_logged_user(request)
+    
+    if logged_user and logged_user.LEVEL_FULL():
+        response = render(request, "blog/admin_profiles.html", {
+            "logged_user": logged_user,
+            "sample_rate": settings.PROFILE_SAMPLE_RATE,
+            "profiles": profiling.list_profiles(),
+        })
+        logged_user.update_session_id(response)
+        return response
+    else:
+        raise PermissionDenied()
+
+def admin_profile_file(request, name, kind):
+    redirect_to_secure(request)
+    logged_user = get_logged_user(request)
+    
+    if logged_user and logged_user.LEVEL_FULL():
+        content = profiling.read_profile(name, kind)
+        if content is None:
+            raise Http404()
+        
+        response = HttpResponse(content=content)
+        if kind in ["txt", "folded"]:
+            response['Content-Type'] = "text/plain; charset=utf-8"
+        elif kind == "json":
+            response['Content-Type'] = "application/json"
+        else:
+            response['Content-Type'] = "application/octet-stream"
+            response["Content-Disposition"] = "attachment; filename={}.{}".format(name, kind)
+        
+        return response
+    else:
+        raise PermissionDenied()
+
+def admin_analytics(request):
+    redirect_to_secure(request)
+    logged_user = get_logged_user(request)
+    
+    if logged_user and logged_user.LEVEL_FULL():
+        days = int(request.GET["days"]) if request.GET.get("days", "").isdigit() else 30
+        days = max(1, min(days, 366))
+        
+        response = render(request, "blog/admin_analytics.html", {
+            "logged_user": logged_user,
+            "enabled": settings.ANALYTICS,
+            "period": days,
+            "report": analytics.report(days),
+        })
+        logged_user.update_session_id(response)
+        return response
+    else:
+        raise PermissionDenied()
+
+def admin_revisions(request, doc_type, pk):
+    redirect_to_secure(request)
+    logged_user = get_logged_user(request)
+    
+    if logged_user and logged_user.POST_WRITE():
+        if doc_type == "post":
+            document = get_object_or_404(models.Post, pk=int(pk))
+        elif doc_type == "page":
+            document = get_object_or_404(models.Page, pk=int(pk))
+        else:
+            raise Http404()
+        
+        revisions_list = list(revisions.revisions(doc_type, document.pk).defer('data')
+                              .select_related('author').order_by('-number'))
+        
+        # Differences between two revisions, by default the selected one
+        # and the one before
+        diff = None
+        if revisions_list and request.GET.get("number", "").isdigit():
+            number = int(request.GET["number"])
+            previous = int(request.GET["from"]) if request.GET.get("from", "").isdigit() else number - 1
+            
+            new = revisions.body(doc_type, document.pk, number)
+            if new is None:
+                raise Http404()
+            old = revisions.body(doc_type, document.pk, previous) if previous > 0 else ""
+            
+            diff = {
+                "number": number,
+                "from": previous,
+                "lines": revisions.unified_diff(old or "", new),
+            }
+        
+        response = render(request, "blog/admin_revisions.html", {
+            "logged_user": logged_user,
+            "doc_type": doc_type,
+            "document": document,
+            "revisions": revisions_list,
+            "diff": diff,
+        })
+        logged_user.update_session_id(response)
+        return response
+    else:
+        raise PermissionDenied()
@@ -0,0 +1,41 @@
+#
+# Copyright (C) 2017-2018 Marco Scarpetta
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+# Templates rendered by the public views
+TEMPLATES = [
+    "blog/index.html",
+    "blog/post.html",
+    "blog/page.html",
+    "blog/tag.html",
+    "blog/author.html",
+    "blog/atom.xml",
+]
+
+def warm_up_process():
+    # Safe before forking: imports the views through the URL resolver and
+    # compiles the templates into the cached loader
+    get_resolver().reverse_dict
+
+    for template_name in TEMPLATES:
+        try:
+            get_template(template_name)
+        except TemplateDoesNotExist:
+            pass
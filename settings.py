@@ -16,7 +16,9 @@
 #
 
 import os
+import sys
 import configparser
+import django
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -32,8 +34,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'code.blog.analytics.AnalyticsMiddleware',
+    'code.blog.compression.CompressionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    'code.blog.routers.ReplicaMiddleware',
+    'code.blog.view_counts.ViewCountMiddleware',
+    'code.blog.render_cache.RenderCacheMiddleware',
+    'code.blog.slow_queries.SlowQueryMiddleware',
+    'code.blog.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'code.urls'
@@ -58,6 +67,14 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'code.wsgi.application'
 
+ASGI_APPLICATION = 'code.asgi.application'
+
+# Set by code.asgi, serves the read views with their async versions
+# (they use the async ORM, from Django 4.1)
+ASYNC_VIEWS = "ASGI" in os.environ and django.VERSION >= (4, 1)
+
+DATABASE_ROUTERS = ['code.blog.routers.ReplicaRouter']
+
 AUTH_PASSWORD_VALIDATORS = []
 
 LANGUAGE_CODE = 'en-us'
@@ -76,6 +93,16 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'resources', 'static'),
 ]
 
+# The production SQLite profile (SQLITE_DATABASE), applied by
+# code.blog.sqlite on each new connection
+SQLITE_PROFILE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 268435456,
+    'cache_size': -65536,
+    'temp_store': 'MEMORY',
+}
+
 if "DEBUG" in os.environ:
     # Debug settings
     SITE_URL = "http://localhost:8000"
@@ -88,13 +115,27 @@ if "DEBUG" in os.environ:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+            'NAME': os.environ.get("SQLITE_DATABASE", os.path.join(BASE_DIR, 'db.sqlite3')),
+            # On disk, so that tests can write from a forked process
+            'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')},
         }
     }
+    
+    # Local read replicas, space separated SQLite database paths. Tests
+    # always have one, its test database is a copy of the primary's made
+    # by the tests (code.blog.tests)
+    sqlite_replicas = os.environ.get("SQLITE_REPLICAS", "").split()
+    if not sqlite_replicas and sys.argv[1:2] == ["test"]:
+        sqlite_replicas = [os.path.join(BASE_DIR, 'replica.sqlite3')]
+    
+    for n, name in enumerate(sqlite_replicas):
+        DATABASES['replica{}'.format(n)] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': name,
+            'TEST': {'NAME': os.path.join(BASE_DIR, 'test_replica{}.sqlite3'.format(n))},
+        }
 else:
     # Heroku server settings
-    import dj_database_url
-    
     SITE_URL = CONFIG["Website"]["url"]
     SECURE_SITE_URL = CONFIG["Website"]["secure_url"]
 
@@ -103,7 +144,29 @@ else:
     INSTALLED_APPS.insert(0, 'whitenoise.runserver_nostatic')
     MIDDLEWARE.insert(0, 'whitenoise.middleware.WhiteNoiseMiddleware')
 
-    DATABASES = {'default': dj_database_url.config(conn_max_age=500)}
+    if "SQLITE_DATABASE" in os.environ:
+        # Single node deployment without a database server
+        DATABASES = {
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.environ["SQLITE_DATABASE"],
+                'CONN_MAX_AGE': 500,
+                'OPTIONS': {
+                    # Seconds a connection waits for a lock held by another writer
+                    'timeout': 20,
+                },
+            }
+        }
+        
+        SQLITE_PRAGMAS = SQLITE_PROFILE_PRAGMAS
+    else:
+        import dj_database_url
+        
+        DATABASES = {'default': dj_database_url.config(conn_max_age=500)}
+        
+        # Read replicas, space separated database URLs
+        for n, url in enumerate(os.environ.get("DATABASE_REPLICA_URLS", "").split()):
+            DATABASES['replica{}'.format(n)] = dj_database_url.parse(url, conn_max_age=500)
 
     SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
@@ -15,8 +15,7 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 
-from django.conf.urls import include
-from django.urls import path
+from django.urls import include, path
 
 urlpatterns = [
     path('', include('code.blog.urls')),
@@ -22,3 +22,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "code.settings")
 
 application = get_wsgi_application()
+
+if "WARM_UP" in os.environ:
+    # With a preloading server (e.g. gunicorn --preload) this runs once in the
+    # master process and is shared by the forked workers
+    from code.blog.warmup import warm_up_process
+    warm_up_process()